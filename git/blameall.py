@@ -14,12 +14,25 @@
    parallel execution.
 
  Features:
-   - Count lines attributed to each author.
+   - Count lines attributed to each author, with .mailmap-aware identities.
    - Track how many files each author has contributed to.
    - Show number of uncommitted lines ("Not Committed Yet").
-   - Display live progress updates in the terminal.
+   - Display live progress updates in the terminal (in place, at a fixed rate),
+     or periodic status lines when output is not a terminal.
    - Optional parallel processing for speed on large repos.
+   - Batch mode over several repositories and/or submodules, sharing one worker
+     pool, with per-repository and combined author tables.
+   - Per-directory rollup saved after each run, queryable without re-blaming.
+   - Optional line-age histograms and medians (vectorised with NumPy when available).
+   - Streaming NDJSON/CSV output of per-file records for dashboards and other tools.
+   - Optional per-file profiling of spawn, git, parse and queue times.
+   - On-disk cache of per-file results, so unchanged files are not blamed again.
+   - Incremental mode that only re-blames files changed since the last run.
+   - Ownership history at sampled revisions (tags or periods), blaming each
+     distinct file version only once across the samples.
    - File filtering and extension ignoring supported.
+   - Binary, generated (by git attributes) and oversized files are skipped
+     before blaming; a per-file timeout guards against pathological files.
 
  Usage:
    # Basic usage on entire repo
@@ -28,6 +41,9 @@
    # Limit analysis to specific files or directories
    ./git_blame_stats.py path/to/file1 path/to/dir2
 
+   # Select with globs (relative to the repository root)
+   ./git_blame_stats.py --include 'src/**/*.py' --exclude 'src/vendor/**'
+
    # Ignore certain extensions (e.g., markdown & text files)
    ./git_blame_stats.py -i .md .txt
 
@@ -37,28 +53,93 @@
    # Run in parallel using 8 threads
    ./git_blame_stats.py --parallel 8
 
+   # Run in parallel, adapting the thread count to CPU usage
+   ./git_blame_stats.py --parallel 0
+
+   # Blame a superproject and all its submodules on one shared worker pool
+   ./git_blame_stats.py --submodules
+
+   # Blame several repositories in one run, with at most 16 blames at a time
+   ./git_blame_stats.py --repos ~/src/app ~/src/lib --parallel 16
+
+   # Ownership at every tag, one CSV row per tag per author
+   ./git_blame_stats.py --history tags --output ownership.csv
+
+   # Only re-blame what changed since the previous incremental run
+   ./git_blame_stats.py --since-last-run
+
+   # Stream per-file records as NDJSON to a file while the run is going
+   ./git_blame_stats.py --format ndjson --output blame.ndjson
+
+   # Query the rollup saved by the last run (no blaming)
+   ./git_blame_stats.py --rollup src/module
+   ./git_blame_stats.py --top-dirs 10 --rank-by concentration
+
  Notes:
    - Must be run inside a Git repository.
    - Requires Git to be installed and accessible in PATH.
    - Handles Unicode safely by replacing invalid sequences.
+   - Blame output is parsed as it streams from git, so memory use per
+     worker does not grow with file size.
 
 =============================================================
 """
 
 import argparse
+import csv
+import json
 import os
+import re
+import sqlite3
 import subprocess
+import shutil
 import sys
-import shlex
+import threading
+import time
+from array import array
 from collections import Counter
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
 
 # ----------------------------------
 # PARAMETERS
 # ----------------------------------
 # Define configuration parameters for Git Blame Statistics Application.
-# UPDATE_INTERVAL: display progress after processing every UPDATE_INTERVAL files.
-UPDATE_INTERVAL = 1
+# RENDER_INTERVAL: seconds between in-place progress redraws when stdout is a terminal.
+RENDER_INTERVAL = 0.1
+# QUIET_RENDER_INTERVAL: seconds between one-line progress reports when stdout is not a terminal.
+QUIET_RENDER_INTERVAL = 10.0
+# BLAME_READ_CHUNK: maximum number of bytes read from the blame pipe per line read.
+BLAME_READ_CHUNK = 64 * 1024
+# NOT_COMMITTED_AUTHOR: author name git blame reports for lines that are not committed.
+NOT_COMMITTED_AUTHOR = "Not Committed Yet"
+# NOT_COMMITTED_SHA: pseudo commit SHA git blame uses for lines that are not committed.
+NOT_COMMITTED_SHA = "0" * 40
+# AUTHOR_HEADER / MAILMAP_LINE: patterns for commit author headers and .mailmap entries.
+AUTHOR_HEADER = re.compile(rb"^author (.*) <(.*)> (\d+) [+-]\d{4}$", re.MULTILINE)
+MAILMAP_LINE = re.compile(r"^\s*([^<#]*?)\s*<([^>]*)>\s*(?:([^<#]*?)\s*<([^>]*)>)?")
+# CACHE_MAX_ENTRIES: default number of per-file results kept in the on-disk blame cache.
+CACHE_MAX_ENTRIES = 200000
+# CACHE_COMMIT_INTERVAL: number of new cache entries written between database commits.
+CACHE_COMMIT_INTERVAL = 500
+# BLAME_TIMEOUT: seconds after which a single git blame is killed (None = no limit; set by --timeout).
+BLAME_TIMEOUT = None
+# MAX_BLAME_FILE_SIZE: default blob size in bytes above which files are skipped (see --max-file-size).
+MAX_BLAME_FILE_SIZE = 2 * 1024 * 1024
+# BINARY_SNIFF_BYTES: number of leading bytes checked for NUL to detect binary files.
+BINARY_SNIFF_BYTES = 8000
+# ADAPTIVE_MAX_WORKERS_PER_CPU: upper bound of the adaptive worker count, per CPU.
+ADAPTIVE_MAX_WORKERS_PER_CPU = 4
+# ADAPT_INTERVAL: seconds between re-evaluations of the adaptive worker count.
+ADAPT_INTERVAL = 0.5
+# ADAPT_GROW_BELOW / ADAPT_SHRINK_ABOVE: CPU saturation bounds (0-1) that grow or shrink the worker count.
+ADAPT_GROW_BELOW = 0.80
+ADAPT_SHRINK_ABOVE = 0.95
 
 
 # ----------------------------------
@@ -76,148 +157,1571 @@ def get_repo_root():
         sys.exit(1)
 
 
-def get_git_tracked_files(ignore_exts):
-    """Get a set of all tracked files using 'git ls-files', filtering by ignore_exts."""
+def build_pathspecs(filter_paths=(), include=(), exclude=(), pathspecs=(), base_dir=None):
+    """
+    Translate the file selection options into git pathspecs, so 'git ls-files' does the matching:
+      - filter_paths: files or directories (relative to base_dir), matched literally.
+      - include / exclude: glob patterns relative to the repository root ('**' crosses directories).
+      - pathspecs: raw git pathspecs, passed through unchanged.
+    A file is selected if it matches any filter path, include glob or pathspec (or if none are
+    given) and no exclude glob. Filter paths outside the repository are ignored with a warning.
+    """
+    repo_root = os.getcwd()
+    base_dir = base_dir or repo_root
+    specs = []
+    for path in filter_paths:
+        rel = os.path.relpath(os.path.abspath(os.path.join(base_dir, path)), repo_root)
+        if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+            print(f"Warning: {path} is outside the repository. Ignoring it.", file=sys.stderr)
+            continue
+        specs.append(":(top,literal)" + ("" if rel == "." else rel.replace(os.sep, "/")))
+    specs += [f":(top,glob){pattern}" for pattern in include]
+    specs += list(pathspecs)
+    if (filter_paths or include or pathspecs) and not specs:
+        # Every positive filter was dropped; make sure nothing is selected rather than everything.
+        specs.append(":(top,literal).git/nonexistent")
+    specs += [f":(top,exclude,glob){pattern}" for pattern in exclude]
+    return specs
+
+
+def get_git_tracked_files(ignore_exts, pathspecs=()):
+    """
+    Get a set of all tracked files using 'git ls-files', filtering by ignore_exts.
+    Path selection is pushed into git through *pathspecs* (see build_pathspecs()).
+    The extensions are compiled into one suffix tuple, so the remaining filtering is a
+    single pass over git's output without filesystem calls.
+    """
     try:
-        files = subprocess.check_output("git ls-files", shell=True, text=True).splitlines()
-        # Convert files to absolute paths using the repository root.
-        repo_root = os.getcwd()  # Already in repo root because of main()
-        tracked = {os.path.abspath(os.path.join(repo_root, f)) for f in files if not any(f.endswith(ext) for ext in ignore_exts)}
-        return tracked
+        files = subprocess.check_output(["git", "ls-files", "-z", "--", *pathspecs],
+                                        text=True, errors="replace").split("\0")
     except subprocess.CalledProcessError:
         print("Error: Not a Git repository or Git is not installed.")
         sys.exit(1)
 
+    # Convert files to absolute paths using the repository root.
+    prefix = os.getcwd() + os.sep  # Already in repo root because of main()
+    suffixes = tuple(ignore_exts)
+    if os.sep != "/":
+        files = [f.replace("/", os.sep) for f in files]
+    return {prefix + f for f in files if f and not (suffixes and f.endswith(suffixes))}
+
 
-def filter_tracked_files(tracked_files, filter_paths):
+def get_blame_for_file(file, timings=None, repo_root=None, rev="HEAD"):
     """
-    Filter the set of tracked files using the user-supplied file or directory paths.
-    Each filter is normalized to an absolute path and used to retain only those tracked files
-    that match. If a filter is a directory, all files within that directory are kept.
+    Runs 'git blame --porcelain' for a given file and parses its output as it streams in.
+    Converts the absolute file path to a relative path (from *repo_root*, by default the
+    current directory) and forces blaming *rev* (HEAD) while ignoring whitespace-only changes.
+    Returns a dict mapping each commit SHA to the number of lines it owns in the file,
+    or None if git blame failed or ran longer than BLAME_TIMEOUT seconds.
+    If a timings dict is given, it is filled with the time spent spawning git ("spawn"),
+    the wall time until git exited ("git"), the Python CPU time spent parsing during
+    that window ("parse"), and the bytes and lines read ("bytes", "lines").
     """
-    filtered = set()
-    normalized_filters = [os.path.abspath(path) for path in filter_paths]
+    # Convert the absolute file path to a relative one (git runs in the repository root)
+    rel_file = os.path.relpath(file, repo_root or os.getcwd())
+    # Always blame against a commit and ignore whitespace differences (e.g. CRLF vs LF).
+    # Passing an argument list avoids shell quoting differences between platforms.
+    blame_cmd = ["git", "blame", "-w", "--porcelain", rev, "--", rel_file]
 
-    for file in tracked_files:
-        for filt in normalized_filters:
-            # Include file if the filter is a directory and file is inside it.
-            if os.path.isdir(filt) and file.startswith(filt + os.sep):
-                filtered.add(file)
-                break
-            # Include file if the filter is a file and there's an exact match.
-            elif os.path.isfile(filt) and file == filt:
-                filtered.add(file)
-                break
-    return filtered
+    start = time.perf_counter()
+    try:
+        proc = subprocess.Popen(blame_cmd, stdout=subprocess.PIPE, cwd=repo_root)
+    except OSError:
+        print(f"Warning: Could not process file {file}. Skipping.", file=sys.stderr)
+        return None
+    spawned = time.perf_counter()
+    cpu_start = time.thread_time()
+
+    # A pathological file must not stall its worker forever: kill git once the timeout expires.
+    watchdog = None
+    if BLAME_TIMEOUT:
+        watchdog = threading.Timer(BLAME_TIMEOUT, proc.kill)
+        watchdog.start()
+    with proc:
+        commit_lines = parse_blame_porcelain(proc.stdout, timings)
+    if watchdog is not None:
+        watchdog.cancel()
+    if timings is not None:
+        timings["spawn"] = spawned - start
+        timings["git"] = time.perf_counter() - spawned
+        timings["parse"] = time.thread_time() - cpu_start
+        timings["lines"] = sum(commit_lines.values())  # Partial count if git failed.
+    if proc.returncode != 0:
+        if proc.returncode < 0 and BLAME_TIMEOUT and time.perf_counter() - spawned >= BLAME_TIMEOUT:
+            print(f"Warning: git blame timed out after {BLAME_TIMEOUT}s on {file}. Skipping.", file=sys.stderr)
+        else:
+            print(f"Warning: Could not process file {file}. Skipping.", file=sys.stderr)
+        return None
+    return commit_lines
 
 
-def get_blame_for_file(file):
+def parse_blame_porcelain(stream, timings=None):
     """
-    Runs 'git blame --line-porcelain' for a given file and returns its output.
-    Converts the absolute file path to a relative path (from the repository root)
-    and forces blaming HEAD while ignoring whitespace-only changes.
-    Uses errors='replace' to avoid UnicodeDecodeErrors.
+    Incrementally parse 'git blame --porcelain' output from a binary stream.
+    Only the commit SHA of each line group is needed; authorship is resolved separately
+    per commit (see CommitResolver), so the repeated metadata headers are skipped.
+    Source lines are read in bounded chunks and discarded, so neither long files nor
+    minified single-line files get buffered.
+    Returns a dict mapping each commit SHA to the number of lines it owns.
+    If a timings dict is given, the number of bytes read is stored in it as "bytes".
     """
-    # Convert the absolute file path to a relative one (assuming current working directory is repo root)
-    rel_file = os.path.relpath(file, os.getcwd())
-    # Always blame against HEAD and ignore whitespace differences (e.g. CRLF vs LF)
-    if os.name == 'nt':
-        # On Windows, use double quotes for the relative path.
-        blame_cmd = f'git blame -w HEAD --line-porcelain "{rel_file}"'
-    else:
-        blame_cmd = f"git blame -w HEAD --line-porcelain {shlex.quote(rel_file)}"
+    commit_lines = {}
+    sha = None  # None means the next line is a group header "<sha> <orig> <final> [<count>]".
+    nbytes = 0
 
-    try:
-        return subprocess.check_output(blame_cmd, shell=True, encoding="utf-8", errors="replace")
-    except subprocess.CalledProcessError:
-        print(f"Warning: Could not process file {file}. Skipping.")
-        return ""
+    readline = stream.readline
+    while True:
+        raw = readline(BLAME_READ_CHUNK)
+        if not raw:
+            break
+        nbytes += len(raw)
+        # Drain the remainder of an over-long line without keeping it.
+        tail = raw
+        while len(tail) == BLAME_READ_CHUNK and not tail.endswith(b"\n"):
+            tail = readline(BLAME_READ_CHUNK)
+            nbytes += len(tail)
+
+        if sha is None:
+            sha = raw[:40].decode("ascii", errors="replace")
+        elif raw[:1] == b"\t":
+            # Every blamed line ends with its TAB-prefixed source line.
+            commit_lines[sha] = commit_lines.get(sha, 0) + 1
+            sha = None
 
+    if timings is not None:
+        timings["bytes"] = nbytes
+    return commit_lines
 
-def process_single_file(file):
+
+def attribute_commit_lines(commit_lines, resolver):
     """
-    Process a single file by running git blame and extracting blame information.
+    Turn per-commit line counts into per-author blame information using *resolver*.
+    A file whose blame failed (commit_lines is None) counts as having no lines.
     Returns a tuple of:
       - A Counter mapping each committed author to the number of lines.
       - A set of committed authors (for participation/touched count).
       - The number of lines marked as 'Not Committed Yet'.
+      - The number of distinct commits that still own lines (the file's surviving revisions).
     """
-    blame_output = get_blame_for_file(file)
     file_counter = Counter()
     touched_authors = set()
     not_committed_count = 0
+    revisions = 0
 
-    for line in blame_output.splitlines():
-        if line.startswith("author "):
-            author = line[len("author "):].strip()
-            if author == "Not Committed Yet":
-                not_committed_count += 1
-            else:
-                file_counter[author] += 1
-                touched_authors.add(author)
+    # Aggregate per commit group rather than per line.
+    for sha, lines in (commit_lines or {}).items():
+        author = resolver.author(sha)
+        if author == NOT_COMMITTED_AUTHOR:
+            not_committed_count += lines
+        else:
+            file_counter[author] += lines
+            touched_authors.add(author)
+            revisions += 1
 
-    return file_counter, touched_authors, not_committed_count
+    return file_counter, touched_authors, not_committed_count, revisions
 
 
-def compute_blame_stats(files):
+def process_single_file(file, resolver, profiler=None, queued_at=None, rev="HEAD"):
+    """
+    Process a single file by running git blame at *rev* and extracting blame information.
+    Git runs in the repository of *resolver* (see CommitResolver.repo_root).
+    Returns a tuple of the per-commit line counts (what the cache stores, None if blame
+    failed) and the per-author result from attribute_commit_lines().
+    If a profiler is given, the stage timings of the file are recorded in it; queued_at is
+    the time.perf_counter() value at which the file was submitted to a thread pool.
+    """
+    if profiler is None:
+        commit_lines = get_blame_for_file(file, repo_root=resolver.repo_root, rev=rev)
+        return commit_lines, attribute_commit_lines(commit_lines, resolver)
+
+    start = time.perf_counter()
+    timings = {"queue": start - queued_at if queued_at is not None else 0.0}
+    commit_lines = get_blame_for_file(file, timings, resolver.repo_root, rev)
+    attributed = time.perf_counter()
+    result = attribute_commit_lines(commit_lines, resolver)
+    timings["attribute"] = time.perf_counter() - attributed
+    timings["total"] = time.perf_counter() - start
+    profiler.record(file, timings)
+    return commit_lines, result
+
+
+class BlameStats:
+    """
+    Running totals of blame statistics across all processed files.
+    Results are added one file at a time, from the cache or from a fresh blame.
+    With keep_results, the result of every file is also kept in self.results so the
+    totals can later be saved and patched by an incremental run.
+    Every result is also rolled up into self.tree, a DirectoryNode per directory, with paths
+    relative to *root* (by default the current directory); set self.tree to None to skip that.
+    If self.ages is set to an AgeStats, the per-commit line counts are also recorded there.
+    If self.sink is set to an output sink, each file's result is written to it as it is added.
+    If self.profiler is set to a BlameProfiler, every blamed file records its stage timings there.
+    """
+
+    def __init__(self, total_files, keep_results=False, root=None):
+        self.root          = root or os.getcwd()
+        self.total_files   = total_files
+        self.files_scanned = 0
+        self.current_file  = ""
+        self.lines         = Counter()   # Total committed lines per author.
+        self.touched       = Counter()   # Number of files each author participated in.
+        self.not_committed = 0           # Total 'Not Committed Yet' lines.
+        self.results       = {} if keep_results else None   # Absolute path -> per-file result.
+        self.tree          = DirectoryNode()    # Per-directory rollup of the same results.
+        self.ages          = None               # Optional AgeStats for line-age analysis.
+        self.sink          = None               # Optional NdjsonSink/CsvSink for per-file records.
+        self.profiler      = None               # Optional BlameProfiler for --profile.
+        self.lock          = threading.Lock()   # Guards the totals against concurrent snapshots.
+
+    def add(self, file, result, commit_lines=None):
+        """
+        Add the result of attribute_commit_lines() (and its per-commit line counts) for one file.
+        A file without line counts (blame failed or timed out) is not kept in self.results,
+        so it is not saved as up to date and an incremental run blames it again.
+        """
+        file_counter, touched, not_committed, _ = result
+        rel_path = os.path.relpath(file, self.root)
+        if self.tree is not None:
+            self.tree.add(rel_path, result)
+        if self.ages is not None and commit_lines:
+            self.ages.add(rel_path, commit_lines)
+        if self.sink is not None:
+            self.sink.write_file(rel_path, result)
+        with self.lock:
+            self.files_scanned += 1
+            self.current_file = file
+            self.lines.update(file_counter)
+            for author in touched:
+                self.touched[author] += 1
+            self.not_committed += not_committed
+            if self.results is not None and commit_lines is not None:
+                self.results[file] = result
+
+    def remove(self, file):
+        """Subtract the previously added contribution of a file from the totals."""
+        with self.lock:
+            result = self.results.pop(file)
+            file_counter, touched, not_committed, _ = result
+            self.tree.add(os.path.relpath(file, self.root), result, sign=-1)
+            self.lines.subtract(file_counter)
+            for author in touched:
+                self.touched[author] -= 1
+            self.not_committed -= not_committed
+            # Drop authors that no longer own any line.
+            self.lines = +self.lines
+            self.touched = +self.touched
+
+    def snapshot(self):
+        """Return a consistent copy of the totals (without per-file results) for display."""
+        with self.lock:
+            snap = BlameStats(self.total_files, root=self.root)
+            snap.tree = None
+            snap.sink = self.sink
+            snap.files_scanned = self.files_scanned
+            snap.current_file = self.current_file
+            snap.lines = self.lines.copy()
+            snap.touched = self.touched.copy()
+            snap.not_committed = self.not_committed
+        return snap
+
+
+def compute_blame_stats(files, resolver, cache=None, stats=None):
     """
     Compute blame statistics on the list of files sequentially and update progress periodically.
+    Commits are attributed to authors through *resolver* (a CommitResolver).
+    If a cache is given, files with a cached result are not blamed again.
+    If stats is given, results are added on top of its existing totals.
+    Returns the BlameStats holding the final totals.
     """
     total_files = len(files)
-    if total_files == 0:
+    if total_files == 0 and stats is None:
         print("No files to process.")
-        return
+        return None
 
-    overall_lines        = Counter()   # Total committed lines per author.
-    overall_touched      = Counter()   # Number of files each author participated in.
-    overall_not_committed = 0          # Total 'Not Committed Yet' lines.
-    files_scanned        = 0
+    stats = stats or BlameStats(total_files)
+    with ProgressRenderer(stats, cache):
+        for file in files:
+            commit_lines = cache.get(file) if cache else None
+            if commit_lines is None:
+                commit_lines, result = process_single_file(file, resolver, stats.profiler)
+                if cache and commit_lines is not None:
+                    cache.put(file, commit_lines)
+            else:
+                result = attribute_commit_lines(commit_lines, resolver)
+            stats.add(file, result, commit_lines)
+    return stats
 
-    for file in files:
-        file_counter, touched, not_committed = process_single_file(file)
-        files_scanned += 1
-        overall_lines.update(file_counter)
-        for author in touched:
-            overall_touched[author] += 1
-        overall_not_committed += not_committed
-        if files_scanned % UPDATE_INTERVAL == 0 or files_scanned == total_files:
-            print_progress(file, files_scanned, total_files, overall_lines, overall_touched, overall_not_committed)
-
-    # Final update if not printed on the last interval
-    if files_scanned % UPDATE_INTERVAL != 0:
-        last_file = files[-1] if files else ""
-        print_progress(last_file, files_scanned, total_files, overall_lines, overall_touched, overall_not_committed)
-
-
-def compute_blame_stats_parallel(files, max_workers):
-    """Compute blame statistics in parallel with *max_workers* threads."""
+
+def compute_blame_stats_parallel(files, max_workers, resolver, cache=None, stats=None):
+    """
+    Compute blame statistics in parallel with *max_workers* threads.
+    Commits are attributed to authors through *resolver* (a CommitResolver).
+    If max_workers is None, the number of concurrent blames adapts to the measured CPU saturation.
+    Cached results are resolved up front so only cache misses are submitted to the pool.
+    Misses are scheduled largest blob first, and only as many tasks as there are active workers
+    are kept in flight, so big files do not end up in a single-threaded tail.
+    If stats is given, results are added on top of its existing totals.
+    Returns the BlameStats holding the final totals.
+    """
     total_files = len(files)
-    if total_files == 0:
+    if total_files == 0 and stats is None:
         print("No files to process.")
-        return
+        return None
+
+    stats = stats or BlameStats(total_files)
+    with ProgressRenderer(stats, cache):
+        misses = []
+        for file in files:
+            commit_lines = cache.get(file) if cache else None
+            if commit_lines is None:
+                misses.append(file)
+            else:
+                stats.add(file, attribute_commit_lines(commit_lines, resolver), commit_lines)
+        run = RepoRun(os.getcwd(), misses, resolver, cache, stats)
+        _blame_in_parallel([(file, run) for file in misses], max_workers, get_blob_sizes() if misses else {})
+    return stats
+
+
+def _blame_in_parallel(tasks, max_workers, sizes, combined=None):
+    """
+    Blame (file, RepoRun) *tasks* on one bounded, size-ordered thread pool and add each result
+    to the stats of its run (and to *combined*, if given). *sizes* maps files to blob sizes.
+    """
+    # Largest first; files missing from HEAD have no size and go last.
+    pending = iter(sorted(tasks, key=lambda task: sizes.get(task[0], 0), reverse=True))
+    limit = WorkerLimit(max_workers)
+
+    with ThreadPoolExecutor(max_workers=limit.max_value) as executor:
+        future_to_task = {}
+        while True:
+            # Top up the window of in-flight tasks to the current worker limit.
+            while len(future_to_task) < limit.value:
+                task = next(pending, None)
+                if task is None:
+                    break
+                file, run = task
+                future = executor.submit(process_single_file, file, run.resolver, run.stats.profiler,
+                                         time.perf_counter(), run.rev)
+                future_to_task[future] = task
+            if not future_to_task:
+                break
+
+            done, _ = wait(future_to_task, return_when=FIRST_COMPLETED)
+            for future in done:
+                commit_lines, result = future.result()
+                current_file, run = future_to_task.pop(future)
+                if run.cache and commit_lines is not None:
+                    run.cache.put(current_file, commit_lines)
+                run.stats.add(current_file, result, commit_lines)
+                if combined is not None:
+                    combined.add(current_file, result, commit_lines)
+            limit.update()
+
+
+# ----------------------------------
+# FILE CLASSIFICATION
+# ----------------------------------
+# This section sorts out files that are not worth blaming (binaries, generated files and very
+# large blobs) before any 'git blame' is spawned.
+
+def get_file_attributes(files):
+    """
+    Return a dict mapping the absolute paths git attributes mark as not blame-worthy to the reason:
+    "binary" for files with the 'diff' attribute unset (e.g. '*.png -diff' or the 'binary' macro),
+    "generated" for files with 'linguist-generated' set. Returns {} if 'git check-attr' fails.
+    Uses a single 'git check-attr --stdin' call for all files.
+    """
+    repo_root = os.getcwd()
+    rel_paths = [os.path.relpath(f, repo_root) for f in files]
+    try:
+        output = subprocess.run(["git", "check-attr", "-z", "--stdin", "diff", "linguist-generated"],
+                                input="\0".join(rel_paths) + "\0", stdout=subprocess.PIPE,
+                                text=True, errors="replace", check=True).stdout
+    except subprocess.CalledProcessError:
+        return {}
+
+    flagged = {}
+    fields = output.split("\0")
+    # Output is a flat sequence of "<path> NUL <attribute> NUL <value> NUL" triples.
+    for i in range(0, len(fields) - 2, 3):
+        path, attribute, value = fields[i:i + 3]
+        if attribute == "diff" and value == "unset":
+            flagged[os.path.join(repo_root, path)] = "binary"
+        elif attribute == "linguist-generated" and value in ("set", "true"):
+            flagged[os.path.join(repo_root, path)] = "generated"
+    return flagged
+
+
+def looks_binary(file):
+    """Quick binary sniff: True if the first BINARY_SNIFF_BYTES of the working copy contain a NUL byte."""
+    try:
+        with open(file, "rb") as fh:
+            return b"\0" in fh.read(BINARY_SNIFF_BYTES)
+    except OSError:
+        return False
+
+
+def classify_files(files, max_size):
+    """
+    Split *files* into those worth blaming and a skip list, before any blame runs.
+    A file is skipped as "binary" or "generated" by git attributes, as "oversized" if its blob in
+    HEAD is larger than *max_size* bytes (0 disables the limit), or as "binary" if its content
+    contains a NUL byte. Submodule entries (directories) are skipped as "submodule". Returns a tuple of:
+      - The set of files to blame.
+      - A dict of skipped file -> (reason, size in bytes).
+    """
+    flagged = get_file_attributes(files)
+    sizes = get_blob_sizes()
+    keep, skipped = set(), {}
+    for file in files:
+        size = sizes.get(file)
+        if size is None:
+            if os.path.isdir(file):
+                skipped[file] = ("submodule", 0)
+                continue
+            try:
+                size = os.path.getsize(file)
+            except OSError:
+                size = 0
+        reason = flagged.get(file)
+        if reason is None and max_size and size > max_size:
+            reason = "oversized"
+        if reason is None and looks_binary(file):
+            reason = "binary"
+        if reason is None:
+            keep.add(file)
+        else:
+            skipped[file] = (reason, size)
+    return keep, skipped
+
+
+def format_skip_summary(skipped):
+    """One-line summary of a skip list: file and byte counts per reason."""
+    if not skipped:
+        return "Skipped 0 files."
+    by_reason = Counter(reason for reason, _ in skipped.values())
+    total_bytes = sum(size for _, size in skipped.values())
+    reasons = ", ".join(f"{count} {reason}" for reason, count in sorted(by_reason.items()))
+    return f"Skipped {len(skipped)} files ({total_bytes / (1024 * 1024):.2f} MB): {reasons}."
+
+
+# ----------------------------------
+# SCHEDULING
+# ----------------------------------
+# This section provides what the parallel path needs to schedule its work: blob sizes to order
+# files by cost, and a worker limit that follows the measured CPU saturation.
+
+def get_blob_sizes():
+    """Return a dict of absolute path -> blob size in bytes for every file in HEAD (submodules have none)."""
+    repo_root = os.getcwd()
+    try:
+        listing = subprocess.check_output(["git", "ls-tree", "-r", "-l", "-z", "HEAD"],
+                                          text=True, errors="replace", stderr=subprocess.DEVNULL)
+    except subprocess.CalledProcessError:
+        return {}
+
+    sizes = {}
+    for entry in listing.split("\0"):
+        if not entry:
+            continue
+        # Entry format: "<mode> <type> <sha> <size padded with spaces>\t<path>"
+        meta, path = entry.split("\t", 1)
+        size = meta.split()[-1]
+        if size.isdigit():
+            sizes[os.path.abspath(os.path.join(repo_root, path))] = int(size)
+    return sizes
+
+
+class WorkerLimit:
+    """
+    Number of blame tasks allowed in flight at once.
+    A fixed limit is used as given. An adaptive limit starts at the CPU count and is adjusted
+    from the CPU time consumed by this process and its git children: it grows while CPUs are
+    idle (workers waiting on I/O) and shrinks once they are saturated, up to max_value.
+    Where child CPU time is not reported (Windows), the old fixed default is used instead.
+    """
+
+    def __init__(self, fixed=None):
+        cpus = os.cpu_count() or 4
+        self.adaptive = fixed is None and os.name != "nt"
+        if fixed:
+            self.value = self.max_value = fixed
+        elif self.adaptive:
+            self.value = cpus
+            self.max_value = min(cpus * ADAPTIVE_MAX_WORKERS_PER_CPU, 1024)
+        else:
+            self.value = self.max_value = cpus * 2
+        self._cpus = cpus
+        self._last = self._sample()
+
+    @staticmethod
+    def _sample():
+        t = os.times()
+        return time.monotonic(), t.user + t.system + t.children_user + t.children_system
+
+    def update(self):
+        """Re-evaluate the limit if at least ADAPT_INTERVAL seconds passed since the last sample."""
+        if not self.adaptive:
+            return
+        now, cpu = self._sample()
+        elapsed = now - self._last[0]
+        if elapsed < ADAPT_INTERVAL:
+            return
+        saturation = (cpu - self._last[1]) / (elapsed * self._cpus)
+        self._last = (now, cpu)
+        if saturation < ADAPT_GROW_BELOW and self.value < self.max_value:
+            self.value = min(self.max_value, self.value + max(1, self.value // 4))
+        elif saturation > ADAPT_SHRINK_ABOVE and self.value > 1:
+            self.value -= 1
+
+
+# ----------------------------------
+# AUTHOR IDENTITY
+# ----------------------------------
+# This section resolves commit SHAs to canonical author identities. Commit headers are read
+# through one long-lived 'git cat-file --batch' process and mapped through .mailmap, so the
+# same person committing under several names or emails is counted once.
+
+def read_mailmap(repo_root=None):
+    """
+    Parse the .mailmap of the repository at *repo_root* (by default the current directory),
+    and the file named by its 'mailmap.file' setting.
+    Returns a dict of lowercased commit email -> {lowercased commit name or None: (proper name, proper email)},
+    where None/empty proper values mean "keep the original".
+    """
+    repo_root = repo_root or os.getcwd()
+    paths = [os.path.join(repo_root, ".mailmap")]
+    extra = subprocess.run(["git", "config", "--path", "mailmap.file"], stdout=subprocess.PIPE, text=True,
+                           cwd=repo_root)
+    if extra.stdout.strip():
+        paths.append(extra.stdout.strip())
+
+    mailmap = {}
+    for path in paths:
+        try:
+            with open(path, encoding="utf-8", errors="replace") as fh:
+                lines = fh.read().splitlines()
+        except OSError:
+            continue
+        for line in lines:
+            if line.lstrip().startswith("#"):
+                continue
+            match = MAILMAP_LINE.match(line)
+            if not match:
+                continue
+            name1, email1, name2, email2 = match.groups()
+            if email2 is None:
+                # "Proper Name <commit@email>"
+                proper, commit_name, commit_email = (name1 or None, None), None, email1
+            else:
+                # "[Proper Name] <proper@email> [Commit Name] <commit@email>"
+                proper, commit_name, commit_email = (name1 or None, email1 or None), name2 or None, email2
+            entry = mailmap.setdefault(commit_email.lower(), {})
+            entry[commit_name.lower() if commit_name else None] = proper
+    return mailmap
+
+
+class CommitResolver:
+    """
+    Maps commit SHAs to canonical author identities and author timestamps.
+    Commit objects are read on demand from a single persistent 'git cat-file --batch' process,
+    the author is canonicalized through .mailmap, and the outcome is memoized per commit.
+    *key* selects what identifies an author: "name", "email" or "both" ("Name <email>").
+    *repo_root* is the repository the commits belong to (by default the current directory);
+    blames of its files run there too (see process_single_file()).
+    Safe to call from several worker threads.
+    """
+
+    def __init__(self, key="name", repo_root=None):
+        self.key = key
+        self.repo_root = repo_root or os.getcwd()
+        self.mailmap = read_mailmap(self.repo_root)
+        self._memo = {NOT_COMMITTED_SHA: (NOT_COMMITTED_AUTHOR, 0)}
+        self._lock = threading.Lock()
+        self._proc = None
+
+    def identity_signature(self):
+        """A string that changes whenever the same commit could resolve to a different author."""
+        return json.dumps([self.key, sorted((k, sorted(v.items(), key=str)) for k, v in self.mailmap.items())])
+
+    def author(self, sha):
+        """Return the canonical author identity of commit *sha*."""
+        return self.commit(sha)[0]
+
+    def commit(self, sha):
+        """Return (canonical author identity, author timestamp) of commit *sha*."""
+        info = self._memo.get(sha)
+        if info is None:
+            with self._lock:
+                info = self._memo.get(sha)
+                if info is None:
+                    info = self._memo[sha] = self._resolve(sha)
+        return info
+
+    def _resolve(self, sha):
+        header = self._read_commit(sha)
+        match = AUTHOR_HEADER.search(header) if header else None
+        if not match:
+            return "Unknown", 0
+        name = match.group(1).decode("utf-8", errors="replace").strip()
+        email = match.group(2).decode("utf-8", errors="replace").strip()
+        timestamp = int(match.group(3))
+        name, email = self._map(name, email)
+        if self.key == "email":
+            return email, timestamp
+        if self.key == "both":
+            return f"{name} <{email}>", timestamp
+        return name, timestamp
+
+    def _map(self, name, email):
+        entries = self.mailmap.get(email.lower())
+        if entries:
+            proper = entries.get(name.lower()) or entries.get(None)
+            if proper:
+                name, email = proper[0] or name, proper[1] or email
+        return name, email
+
+    def _read_commit(self, sha):
+        """Return the header block of a commit object, or None if it cannot be read."""
+        if self._proc is None:
+            self._proc = subprocess.Popen(["git", "cat-file", "--batch"], cwd=self.repo_root,
+                                          stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._proc.stdin.write(sha.encode("ascii", errors="replace") + b"\n")
+        self._proc.stdin.flush()
+        info = self._proc.stdout.readline().split()
+        if len(info) != 3:
+            return None
+        body = self._proc.stdout.read(int(info[2]) + 1)  # Object content plus trailing LF.
+        if info[1] != b"commit":
+            return None
+        return body.split(b"\n\n", 1)[0]
+
+    def close(self):
+        """Stop the cat-file process."""
+        if self._proc is not None:
+            self._proc.stdin.close()
+            self._proc.wait()
+            self._proc = None
+
+
+# ----------------------------------
+# CACHE
+# ----------------------------------
+# This section implements the persistent blame result cache, which lets repeated runs skip
+# 'git blame' for files whose content has not changed since the previous run.
+
+def get_git_dir():
+    """Return the absolute path of the repository's .git directory."""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--absolute-git-dir"], text=True).strip()
+    except subprocess.CalledProcessError:
+        print("Error: Not a Git repository or Git is not installed.")
+        sys.exit(1)
+
+
+def get_blame_cache_keys():
+    """
+    Build the cache key of every tracked file, as a dict of absolute path -> key.
+    Files whose content matches HEAD are keyed by the blob SHA from 'git ls-files -s'.
+    Files with staged or unstaged edits (or merge conflicts) are keyed by the HEAD commit,
+    because the blob in the index does not describe what gets blamed.
+    """
+    repo_root = os.getcwd()
+    try:
+        staged = subprocess.check_output(["git", "ls-files", "-s", "-z"], text=True, errors="replace")
+        head = subprocess.run(["git", "rev-parse", "--verify", "-q", "HEAD"],
+                              stdout=subprocess.PIPE, text=True).stdout.strip()
+        changed = subprocess.check_output(["git", "diff", "--name-only", "-z", "HEAD"],
+                                          text=True, errors="replace") if head else ""
+    except subprocess.CalledProcessError:
+        print("Warning: Could not read the Git index. Blame cache disabled for this run.", file=sys.stderr)
+        return {}
+
+    modified = set(changed.split("\0"))
+    keys = {}
+    for entry in staged.split("\0"):
+        if not entry:
+            continue
+        # Entry format: "<mode> <blob sha> <stage>\t<path>"
+        meta, path = entry.split("\t", 1)
+        _, blob, stage = meta.split(" ")
+        file = os.path.abspath(os.path.join(repo_root, path))
+        if stage != "0" or path in modified:
+            keys[file] = f"HEAD:{head}"
+        else:
+            keys[file] = f"blob:{blob}"
+    return keys
+
+
+class BlameCache:
+    """
+    Persistent SQLite cache of per-file blame results.
+    Each row stores a file's per-commit line counts (including the 'Not Committed Yet'
+    pseudo-commit), keyed by the repository-relative path and the key from
+    get_blame_cache_keys(). Authors are resolved from the commits when a row is read,
+    so mailmap or --author-key changes do not invalidate the cache.
+    At most max_entries rows are kept; the least recently used rows are evicted on close.
+    Paths are made relative to the current directory (the repository root) at creation time.
+    The cache is only accessed from the thread that created it.
+    """
+
+    SCHEMA_VERSION = 2
+
+    def __init__(self, db_path, keys, max_entries=CACHE_MAX_ENTRIES):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db = sqlite3.connect(db_path)
+        self.root = os.getcwd()
+        self.keys = keys
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._now = int(time.time())
+        self._used = []      # (last_used, path, key) rows to refresh on close.
+        self._pending = 0    # Writes since the last commit.
+
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+            self.db.execute("DROP TABLE IF EXISTS blame")
+            self.db.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS blame ("
+            " path TEXT NOT NULL, key TEXT NOT NULL, commits TEXT NOT NULL,"
+            " last_used INTEGER NOT NULL,"
+            " PRIMARY KEY (path, key))"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS blame_last_used ON blame (last_used)")
+        self.db.commit()
+
+    def _locate(self, file):
+        key = self.keys.get(file)
+        return os.path.relpath(file, self.root), key
+
+    def get(self, file):
+        """Return the cached per-commit line counts for a file, or None."""
+        path, key = self._locate(file)
+        row = None
+        if key is not None:
+            row = self.db.execute(
+                "SELECT commits FROM blame WHERE path = ? AND key = ?", (path, key)
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._used.append((self._now, path, key))
+        return json.loads(row[0])
+
+    def put(self, file, commit_lines):
+        """Store the per-commit line counts of a file, replacing entries for older versions of it."""
+        path, key = self._locate(file)
+        if key is None:
+            return
+        self.db.execute("DELETE FROM blame WHERE path = ?", (path,))
+        self.db.execute(
+            "INSERT INTO blame (path, key, commits, last_used) VALUES (?, ?, ?, ?)",
+            (path, key, json.dumps(commit_lines), self._now),
+        )
+        self._pending += 1
+        if self._pending >= CACHE_COMMIT_INTERVAL:
+            self.db.commit()
+            self._pending = 0
+
+    def close(self):
+        """Refresh usage timestamps, evict the oldest entries beyond max_entries and close."""
+        self.db.executemany("UPDATE blame SET last_used = ? WHERE path = ? AND key = ?", self._used)
+        excess = self.db.execute("SELECT COUNT(*) FROM blame").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self.db.execute(
+                "DELETE FROM blame WHERE rowid IN (SELECT rowid FROM blame ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+        self.db.commit()
+        self.db.close()
+
+
+def open_blame_cache(max_entries):
+    """Open the blame cache stored under the repository's .git directory."""
+    db_path = os.path.join(get_git_dir(), "blameall", "cache.sqlite")
+    try:
+        return BlameCache(db_path, get_blame_cache_keys(), max_entries)
+    except sqlite3.Error as e:
+        print(f"Warning: Could not open blame cache {db_path}: {e}. Continuing without cache.", file=sys.stderr)
+        return None
+
+
+# ----------------------------------
+# INCREMENTAL RUNS
+# ----------------------------------
+# This section implements --since-last-run: the per-file results of a run are saved together
+# with the HEAD they were computed at, and the next run only re-blames what changed since.
+
+LAST_RUN_VERSION = 3
+
+
+def get_head_commit():
+    """Return the SHA of HEAD, or None if the repository has no commits yet."""
+    result = subprocess.run(["git", "rev-parse", "--verify", "-q", "HEAD"], stdout=subprocess.PIPE, text=True)
+    return result.stdout.strip() or None
+
+
+def get_changed_paths(since):
+    """
+    Return the absolute paths that changed between commit *since* and HEAD, plus the paths
+    with staged or unstaged edits in the working tree. Returns None if *since* is unknown.
+    """
+    repo_root = os.getcwd()
+    try:
+        committed = subprocess.check_output(["git", "diff", "--name-only", "-z", since, "HEAD"],
+                                            text=True, errors="replace", stderr=subprocess.DEVNULL)
+        working = subprocess.check_output(["git", "diff", "--name-only", "-z", "HEAD"],
+                                          text=True, errors="replace")
+    except subprocess.CalledProcessError:
+        return None
+    paths = set(committed.split("\0")) | set(working.split("\0"))
+    paths.discard("")
+    return {os.path.abspath(os.path.join(repo_root, p)) for p in paths}
+
+
+def load_last_run(state_path, identity):
+    """
+    Load the state saved by the previous --since-last-run run, or None if unusable.
+    The saved totals are per author, so they are only reused if *identity* (see
+    CommitResolver.identity_signature()) is unchanged.
+    """
+    try:
+        with open(state_path, encoding="utf-8") as fh:
+            state = json.load(fh)
+    except (OSError, ValueError):
+        return None
+    if state.get("version") != LAST_RUN_VERSION or state.get("identity") != identity:
+        return None
+    return state
+
+
+def save_last_run(state_path, head, identity, stats):
+    """Save the per-file results and totals of this run together with the HEAD they describe."""
+    repo_root = os.getcwd()
+    state = {
+        "version": LAST_RUN_VERSION,
+        "head": head,
+        "identity": identity,
+        "totals": {
+            "lines": stats.lines,
+            "touched": stats.touched,
+            "not_committed": stats.not_committed,
+        },
+        "files": {
+            os.path.relpath(file, repo_root): [file_counter, not_committed, revisions]
+            for file, (file_counter, _, not_committed, revisions) in stats.results.items()
+        },
+    }
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(state, fh)
+    os.replace(tmp_path, state_path)
+
+
+def plan_incremental_run(state, files):
+    """
+    Work out what an incremental run has to re-blame.
+    Starts from the totals saved in *state*, subtracts the old contribution of every file that
+    changed since the saved HEAD or is no longer selected, and returns a tuple of:
+      - The patched BlameStats (with keep_results set), ready for new results to be added.
+      - The sorted list of selected files that need to be blamed again.
+    Falls back to blaming every selected file if there is no usable state.
+    """
+    changed = get_changed_paths(state["head"]) if state else None
+    if changed is None:
+        if state:
+            print(f"Warning: Last analysed commit {state['head']} is not available. Re-blaming everything.",
+                  file=sys.stderr)
+        return BlameStats(len(files), keep_results=True), sorted(files)
+
+    repo_root = os.getcwd()
+    previous = {
+        os.path.abspath(os.path.join(repo_root, path)): (Counter(file_counter), set(file_counter), not_committed, revisions)
+        for path, (file_counter, not_committed, revisions) in state["files"].items()
+    }
+    selected = set(files)
+    to_blame = sorted(f for f in selected if f in changed or f not in previous)
+
+    stats = BlameStats(len(to_blame), keep_results=True)
+    stats.lines = Counter(state["totals"]["lines"])
+    stats.touched = Counter(state["totals"]["touched"])
+    stats.not_committed = state["totals"]["not_committed"]
+    stats.results = previous
+    for file, result in previous.items():
+        stats.tree.add(os.path.relpath(file, repo_root), result)
+    for file in [f for f in previous if f in changed or f not in selected]:
+        stats.remove(file)
+    return stats, to_blame
+
+
+# ----------------------------------
+# BATCH MODE
+# ----------------------------------
+# This section blames several repositories (e.g. a superproject and its submodules) in one run.
+# Every repository keeps its own resolver, cache and totals, but all files share one worker pool.
+
+class RepoRun:
+    """
+    The files of one repository to blame at revision *rev*, with the CommitResolver, BlameCache
+    and BlameStats they use.
+    """
+
+    def __init__(self, root, files, resolver, cache, stats, rev="HEAD"):
+        self.root = root
+        self.rev = rev
+        self.files = files
+        self.resolver = resolver
+        self.cache = cache
+        self.stats = stats
+
+
+def find_repositories(paths, submodules=False):
+    """
+    Resolve *paths* to the roots of the repositories they are in and, with *submodules*, add the
+    root of every initialized submodule below them (recursively).
+    Returns the unique roots in the order they were found.
+    """
+    roots = []
+    for path in paths:
+        try:
+            root = subprocess.check_output(["git", "-C", path, "rev-parse", "--show-toplevel"],
+                                           text=True, stderr=subprocess.DEVNULL).strip()
+        except (subprocess.CalledProcessError, OSError):
+            print(f"Warning: {path} is not inside a Git repository. Ignoring it.", file=sys.stderr)
+            continue
+        found = [root]
+        if submodules:
+            found += subprocess.run(["git", "-C", root, "submodule", "--quiet", "foreach", "--recursive", "pwd"],
+                                    stdout=subprocess.PIPE, text=True).stdout.splitlines()
+        for root in found:
+            root = os.path.abspath(root)
+            if root not in roots:
+                roots.append(root)
+    return roots
+
+
+def compute_batch_blame_stats(runs, max_workers, sizes):
+    """
+    Blame the files of several repositories (a list of RepoRun) on one shared thread pool.
+    Cached results of every run are resolved up front; the misses of all runs are then scheduled
+    together, largest blob first (*sizes* maps files to blob sizes), under a single worker limit
+    (None = adaptive), so the batch neither oversubscribes nor idles the machine.
+    Each result is added to the BlameStats of its run and to the combined BlameStats returned.
+    """
+    combined = BlameStats(sum(len(run.files) for run in runs))
+    combined.tree = None  # Paths of different repositories do not share a directory tree.
+    with ProgressRenderer(combined):
+        tasks = []
+        for run in runs:
+            for file in run.files:
+                commit_lines = run.cache.get(file) if run.cache else None
+                if commit_lines is None:
+                    tasks.append((file, run))
+                    continue
+                result = attribute_commit_lines(commit_lines, run.resolver)
+                run.stats.add(file, result, commit_lines)
+                combined.add(file, result, commit_lines)
+        _blame_in_parallel(tasks, max_workers, sizes, combined)
+    return combined
+
+
+def print_batch_report(runs, combined):
+    """Print the author table of every repository, then the combined table of the batch."""
+    for run in runs:
+        print(f"\n== {run.root} ({run.stats.files_scanned} files) ==")
+        print(f"Not Committed Yet lines: {run.stats.not_committed}")
+        print("\n".join(format_author_table(run.stats.lines, run.stats.touched)))
+    print(f"\n== Combined: {len(runs)} repositories ({combined.files_scanned} files) ==")
+    print(f"Not Committed Yet lines: {combined.not_committed}")
+    print("\n".join(format_author_table(combined.lines, combined.touched)))
+
+
+# ----------------------------------
+# OWNERSHIP HISTORY
+# ----------------------------------
+# This section computes author totals at a series of sampled revisions (--history). Each distinct
+# (path, blob) pair is blamed only once across all samples, so a file that did not change between
+# two samples costs nothing the second time.
+
+HISTORY_PERIODS = {"monthly": "month", "quarterly": "quarter", "yearly": "year"}
+
+
+def get_history_samples(specs):
+    """
+    Resolve --history arguments to a list of (label, commit SHA, commit timestamp), oldest first:
+      - "tags": every tag pointing to a commit, labelled with the tag name.
+      - "monthly" / "quarterly" / "yearly": the last first-parent commit of HEAD in each period.
+      - Anything else is taken as a revision and labelled with itself.
+    """
+    labelled = []  # (label, revision)
+    for spec in specs:
+        if spec == "tags":
+            refs = subprocess.check_output(
+                ["git", "for-each-ref", "--sort=creatordate",
+                 "--format=%(refname:short)%00%(objecttype)%00%(*objecttype)", "refs/tags"],
+                text=True, errors="replace")
+            for line in refs.splitlines():
+                name, objecttype, peeled = line.split("\0")
+                if "commit" in (objecttype, peeled):
+                    labelled.append((name, f"refs/tags/{name}^{{commit}}"))
+        elif spec in HISTORY_PERIODS:
+            period = HISTORY_PERIODS[spec]
+            log = subprocess.check_output(["git", "log", "--first-parent", "--format=%H %ct", "HEAD"], text=True)
+            seen = set()
+            for line in log.splitlines():  # Newest first, so the first commit seen per period is its last.
+                sha, timestamp = line.split()
+                t = time.gmtime(int(timestamp))
+                if period == "month":
+                    label = f"{t.tm_year}-{t.tm_mon:02d}"
+                elif period == "quarter":
+                    label = f"{t.tm_year}-Q{(t.tm_mon - 1) // 3 + 1}"
+                else:
+                    label = str(t.tm_year)
+                if label not in seen:
+                    seen.add(label)
+                    labelled.append((label, sha))
+        else:
+            labelled.append((spec, f"{spec}^{{commit}}"))
+    if not labelled:
+        return []
+
+    result = subprocess.run(["git", "rev-parse", *(rev for _, rev in labelled)],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        print(f"Error: {result.stderr.strip().splitlines()[0]}")
+        sys.exit(1)
+    shas = result.stdout.split()
+    times = dict(line.split() for line in subprocess.check_output(
+        ["git", "show", "-s", "--format=%H %ct", *set(shas)], text=True).splitlines())
+    samples = [(label, sha, int(times[sha])) for (label, _), sha in zip(labelled, shas)]
+    samples.sort(key=lambda sample: sample[2])
+    return samples
+
+
+def get_tree_blobs(rev, pathspecs=(), ignore_exts=()):
+    """
+    Return a dict of absolute path -> blob SHA for the files of commit *rev* selected by *pathspecs*
+    and not ending in one of *ignore_exts*. Submodule entries are left out.
+    The tree is listed with 'git diff-tree' against the empty tree, because unlike 'git ls-tree'
+    it understands the pathspec magic produced by build_pathspecs().
+    """
+    repo_root = os.getcwd()
+    empty_tree = subprocess.check_output(["git", "hash-object", "-t", "tree", "--stdin"], input="", text=True).strip()
+    output = subprocess.check_output(["git", "diff-tree", "-r", "-z", "--no-renames", empty_tree, rev, "--", *pathspecs],
+                                     text=True, errors="replace")
+    fields = output.split("\0")
+    suffixes = tuple(ignore_exts)
+    blobs = {}
+    # Entries are "<:old mode> <new mode> <old sha> <new sha> <status>" NUL "<path>" NUL.
+    for meta, path in zip(fields[0::2], fields[1::2]):
+        _, mode, _, blob, _ = meta.split(" ")
+        if mode == "160000" or (suffixes and path.endswith(suffixes)):
+            continue
+        blobs[os.path.join(repo_root, path.replace("/", os.sep))] = blob
+    return blobs
+
+
+def get_object_sizes(shas):
+    """Return a dict of object SHA -> size in bytes, read with one 'git cat-file --batch-check' call."""
+    if not shas:
+        return {}
+    output = subprocess.run(["git", "cat-file", "--batch-check=%(objectname) %(objectsize)"],
+                            input="\n".join(shas) + "\n", stdout=subprocess.PIPE, text=True).stdout
+    sizes = {}
+    for line in output.splitlines():
+        sha, size = line.split(" ", 1)
+        if size.isdigit():
+            sizes[sha] = int(size)
+    return sizes
+
+
+def get_binary_blobs(shas):
+    """
+    Return the set of blob SHAs whose first BINARY_SNIFF_BYTES contain a NUL byte, the same
+    sniff as looks_binary(), reading the blobs through one 'git cat-file --batch' process.
+    """
+    binary = set()
+    if not shas:
+        return binary
+    proc = subprocess.Popen(["git", "cat-file", "--batch"], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    try:
+        for sha in shas:
+            proc.stdin.write(sha.encode("ascii") + b"\n")
+            proc.stdin.flush()
+            info = proc.stdout.readline().split()
+            if len(info) != 3:
+                continue  # Missing object.
+            size = int(info[2])
+            head = proc.stdout.read(min(size, BINARY_SNIFF_BYTES))
+            if b"\0" in head:
+                binary.add(sha)
+            remaining = size - len(head) + 1  # Rest of the content plus trailing LF.
+            while remaining > 0:
+                chunk = proc.stdout.read(min(remaining, 1 << 20))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+    finally:
+        proc.stdin.close()
+        proc.wait()
+    return binary
+
+
+def compute_history_stats(samples, resolver, pathspecs, ignore_exts, max_workers, max_size=None):
+    """
+    Compute the author totals of the selected files at every sample of get_history_samples().
+    Each distinct (path, blob) pair is blamed once, at the first sample containing it, and its
+    result is reused by every later sample in which the file is unchanged. Like the blame cache,
+    this assumes a path with the same content has the same blame.
+    If max_size is given, generated, binary and oversized files are left out, as in
+    classify_files() (judged by the current attributes, the blob size and a NUL byte near
+    the start of the blob).
+    Returns a list of (label, commit SHA, timestamp, BlameStats) in sample order.
+    """
+    repo_root = os.getcwd()
+    trees = [get_tree_blobs(sha, pathspecs, ignore_exts) for _, sha, _ in samples]
+
+    first_seen = {}  # (path, blob) -> index of the first sample containing it.
+    for index, tree in enumerate(trees):
+        for pair in tree.items():
+            first_seen.setdefault(pair, index)
+    blob_sizes = get_object_sizes({blob for _, blob in first_seen})
+    if max_size is not None:
+        flagged = get_file_attributes({file for file, _ in first_seen})
+        first_seen = {(file, blob): index for (file, blob), index in first_seen.items()
+                      if file not in flagged and not (max_size and blob_sizes.get(blob, 0) > max_size)}
+        binary = get_binary_blobs({blob for _, blob in first_seen})
+        first_seen = {pair: index for pair, index in first_seen.items() if pair[1] not in binary}
+
+    runs = [RepoRun(repo_root, [], resolver, None, BlameStats(0, keep_results=True), rev=sha)
+            for _, sha, _ in samples]
+    sizes = {}
+    for (file, blob), index in first_seen.items():
+        runs[index].files.append(file)
+        sizes[file] = max(sizes.get(file, 0), blob_sizes.get(blob, 0))
+
+    combined = BlameStats(len(first_seen))
+    combined.tree = None
+    with ProgressRenderer(combined, stream=sys.stderr):
+        _blame_in_parallel([(file, run) for run in runs for file in run.files], max_workers, sizes, combined)
 
-    overall_lines        = Counter()   # Total committed lines per author.
-    overall_touched      = Counter()   # Number of files each author participated in.
-    overall_not_committed = 0          # Total 'Not Committed Yet' lines.
-    files_scanned        = 0
-
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_file = {executor.submit(process_single_file, f): f for f in files}
-        for future in as_completed(future_to_file):
-            file_counter, touched, not_committed = future.result()
-            current_file = future_to_file[future]
-            files_scanned += 1
-            overall_lines.update(file_counter)
+    results = {}  # (path, blob) -> result of attribute_commit_lines()
+    for tree, run in zip(trees, runs):
+        for file, result in run.stats.results.items():
+            results[file, tree[file]] = result
+
+    history = []
+    for (label, sha, timestamp), tree in zip(samples, trees):
+        stats = BlameStats(len(tree))
+        stats.tree = None
+        for pair in tree.items():
+            if pair in results:
+                stats.add(pair[0], results[pair])
+        history.append((label, sha, timestamp, stats))
+    print(f"Sampled {len(samples)} revisions: blamed {len(first_seen)} distinct file versions "
+          f"for {sum(len(tree) for tree in trees)} file snapshots.", file=sys.stderr)
+    return history
+
+
+def write_history(history, stream, fmt="csv"):
+    """Write one row per sampled revision per author (lines, files and share of lines) as CSV or NDJSON."""
+    fields = ["revision", "commit", "date", "author", "lines", "files", "share"]
+    writer = csv.writer(stream) if fmt == "csv" else None
+    if writer:
+        writer.writerow(fields)
+    for label, sha, timestamp, stats in history:
+        date = time.strftime("%Y-%m-%d", time.gmtime(timestamp))
+        total = sum(stats.lines.values())
+        for author, lines in stats.lines.most_common():
+            row = [label, sha, date, author, lines, stats.touched[author], round(lines / total, 6)]
+            if writer:
+                writer.writerow(row)
+            else:
+                stream.write(json.dumps(dict(zip(fields, row)), ensure_ascii=False) + "\n")
+    stream.flush()
+
+
+# ----------------------------------
+# DIRECTORY ROLLUP
+# ----------------------------------
+# This section rolls per-file results up into a prefix tree of directories. The tree is saved
+# after every run, so the breakdown of any subtree can be queried later without running git blame.
+
+ROLLUP_VERSION = 1
+
+
+class DirectoryNode:
+    """
+    One directory of the rollup tree, holding the totals of every file below it:
+    per-author committed lines, per-author files touched, the number of files,
+    'Not Committed Yet' lines and revisions (distinct commits still owning lines, summed per file).
+    """
+
+    __slots__ = ("children", "lines", "touched", "files", "not_committed", "revisions")
+
+    def __init__(self):
+        self.children = {}
+        self.lines = Counter()
+        self.touched = Counter()
+        self.files = 0
+        self.not_committed = 0
+        self.revisions = 0
+
+    def add(self, rel_path, result, sign=1):
+        """Add (or with sign=-1, subtract) a file's result to this node and every directory on its path."""
+        file_counter, touched, not_committed, revisions = result
+        node = self
+        parts = rel_path.replace(os.sep, "/").split("/")[:-1]
+        for depth in range(len(parts) + 1):
+            if sign > 0:
+                node.lines.update(file_counter)
+            else:
+                node.lines.subtract(file_counter)
             for author in touched:
-                overall_touched[author] += 1
-            overall_not_committed += not_committed
-            if files_scanned % UPDATE_INTERVAL == 0 or files_scanned == total_files:
-                print_progress(current_file, files_scanned, total_files, overall_lines, overall_touched, overall_not_committed)
+                node.touched[author] += sign
+            node.files += sign
+            node.not_committed += sign * not_committed
+            node.revisions += sign * revisions
+            if depth < len(parts):
+                node = node.children.setdefault(parts[depth], DirectoryNode())
+
+    def find(self, rel_dir):
+        """Return the node of a directory relative to this one, or None if it is not in the tree."""
+        node = self
+        for part in rel_dir.replace(os.sep, "/").split("/"):
+            if part in ("", "."):
+                continue
+            node = node.children.get(part)
+            if node is None:
+                return None
+        return node
+
+    def walk(self, prefix=""):
+        """Yield (relative directory, node) for every directory below this one."""
+        for name, child in sorted(self.children.items()):
+            path = f"{prefix}{name}"
+            yield path, child
+            yield from child.walk(path + "/")
+
+    def concentration(self):
+        """Share (0-1) of committed lines owned by the directory's top author."""
+        total = sum(self.lines.values())
+        return max(self.lines.values()) / total if total else 0.0
+
+    def to_dict(self):
+        return {
+            "files": self.files,
+            "not_committed": self.not_committed,
+            "revisions": self.revisions,
+            "lines": +self.lines,
+            "touched": +self.touched,
+            "children": {name: child.to_dict() for name, child in self.children.items() if child.files > 0},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        node = cls()
+        node.files = data["files"]
+        node.not_committed = data["not_committed"]
+        node.revisions = data["revisions"]
+        node.lines = Counter(data["lines"])
+        node.touched = Counter(data["touched"])
+        node.children = {name: cls.from_dict(child) for name, child in data["children"].items()}
+        return node
+
+
+def save_rollup(rollup_path, head, tree):
+    """Save the directory rollup of a run together with the HEAD it describes."""
+    os.makedirs(os.path.dirname(rollup_path), exist_ok=True)
+    tmp_path = rollup_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump({"version": ROLLUP_VERSION, "head": head, "root": tree.to_dict()}, fh)
+    os.replace(tmp_path, rollup_path)
+
+
+def load_rollup(rollup_path):
+    """Load a saved rollup as (head, root DirectoryNode), or exit if there is none."""
+    try:
+        with open(rollup_path, encoding="utf-8") as fh:
+            data = json.load(fh)
+    except (OSError, ValueError):
+        data = None
+    if not data or data.get("version") != ROLLUP_VERSION:
+        print("Error: No saved directory rollup found. Run a blame analysis first.")
+        sys.exit(1)
+    return data["head"], DirectoryNode.from_dict(data["root"])
 
-    # Final update if not printed on the last interval
-    if files_scanned % UPDATE_INTERVAL != 0:
-        last_file = files[-1] if files else ""
-        print_progress(last_file, files_scanned, total_files, overall_lines, overall_touched, overall_not_committed)
+
+def print_rollup(root, head, rel_dir):
+    """Print the author breakdown of one directory of a saved rollup and a summary of its subdirectories."""
+    node = root.find(rel_dir)
+    if node is None:
+        print(f"Directory not found in the saved rollup: {rel_dir}")
+        sys.exit(1)
+    print(f"Directory: {rel_dir or '.'} (rollup at {head[:12] if head else 'unknown HEAD'})")
+    print(f"Files: {node.files}  Revisions: {node.revisions}  Not Committed Yet lines: {node.not_committed}\n")
+    print("\n".join(format_author_table(node.lines, node.touched)))
+    if node.children:
+        print(f"\n{'Subdirectory':<40} {'Files':>8} {'Lines':>10} {'Authors':>8}")
+        print("-" * 70)
+        for name, child in sorted(node.children.items(), key=lambda kv: -sum(kv[1].lines.values())):
+            print(f"{name + '/':<40} {child.files:>8} {sum(child.lines.values()):>10} {len(child.lines):>8}")
+
+
+def print_top_directories(root, count, rank_by):
+    """
+    Print the *count* top directories of a saved rollup ranked by:
+      - lines: committed lines,
+      - churn: revisions (distinct commits still owning lines, summed per file),
+      - concentration: share of committed lines owned by the top author.
+    """
+    keys = {
+        "lines": lambda node: sum(node.lines.values()),
+        "churn": lambda node: node.revisions,
+        "concentration": lambda node: node.concentration(),
+    }
+    ranked = sorted(((path, node) for path, node in root.walk() if node.lines),
+                    key=lambda item: (keys[rank_by](item[1]), sum(item[1].lines.values())), reverse=True)
+
+    print(f"{'Directory':<40} {'Files':>7} {'Lines':>9} {'Revisions':>10} {'Top author':<24} {'Share':>7}")
+    print("-" * 102)
+    for path, node in ranked[:count]:
+        top_author, _ = node.lines.most_common(1)[0]
+        print(f"{path + '/':<40} {node.files:>7} {sum(node.lines.values()):>9} {node.revisions:>10} "
+              f"{top_author[:24]:<24} {node.concentration() * 100:>6.2f}%")
+
+
+# ----------------------------------
+# LINE AGE
+# ----------------------------------
+# This section implements --age: the author time of every blamed line is kept per author and per
+# directory in compact numeric arrays, and aggregated with NumPy (when installed) into age
+# histograms and medians.
+
+class AgeStats:
+    """
+    Line timestamps per author and per directory (cut at *depth* path components).
+    All lines of a file that come from the same commit share one timestamp, so each array
+    pair stores (timestamp, line count) per file and commit instead of one entry per line.
+    """
+
+    def __init__(self, resolver, depth=1):
+        self.resolver = resolver
+        self.depth = depth
+        self.by_author = {}   # Author -> (array of timestamps, array of line counts)
+        self.by_dir = {}      # Directory -> (array of timestamps, array of line counts)
+
+    def add(self, rel_path, commit_lines):
+        """Record the line timestamps of one file from its per-commit line counts."""
+        parts = rel_path.replace(os.sep, "/").split("/")[:-1][:self.depth]
+        directory = "/".join(parts) or "."
+        dir_times, dir_weights = self.by_dir.setdefault(directory, (array("q"), array("q")))
+        for sha, lines in commit_lines.items():
+            author, timestamp = self.resolver.commit(sha)
+            if author == NOT_COMMITTED_AUTHOR:
+                continue
+            times, weights = self.by_author.setdefault(author, (array("q"), array("q")))
+            times.append(timestamp)
+            weights.append(lines)
+            dir_times.append(timestamp)
+            dir_weights.append(lines)
+
+    def overall(self):
+        """Return the (timestamps, line counts) arrays of every line."""
+        times, weights = array("q"), array("q")
+        for t, w in self.by_author.values():
+            times.extend(t)
+            weights.extend(w)
+        return times, weights
+
+
+def weighted_median(times, weights):
+    """Return the median timestamp of lines given as (timestamp, line count) arrays."""
+    if NUMPY_AVAILABLE:
+        t = np.frombuffer(times, dtype=np.int64)
+        w = np.frombuffer(weights, dtype=np.int64)
+        order = np.argsort(t, kind="stable")
+        cumulative = np.cumsum(w[order])
+        return int(t[order][np.searchsorted(cumulative, cumulative[-1] / 2)])
+
+    pairs = sorted(zip(times, weights))
+    half, seen = sum(weights) / 2, 0
+    for timestamp, count in pairs:
+        seen += count
+        if seen >= half:
+            return timestamp
+    return pairs[-1][0]
+
+
+def age_histogram(times, weights, bucket):
+    """Return a sorted list of (bucket label, lines) with buckets of one "year" or "quarter"."""
+    if NUMPY_AVAILABLE:
+        months = np.frombuffer(times, dtype=np.int64).astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)
+        keys = months // 12 if bucket == "year" else months // 3
+        unique, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse, weights=np.frombuffer(weights, dtype=np.int64))
+        pairs = zip(unique.tolist(), counts.astype(np.int64).tolist())
+    else:
+        totals = Counter()
+        for timestamp, count in zip(times, weights):
+            t = time.gmtime(timestamp)
+            months = (t.tm_year - 1970) * 12 + t.tm_mon - 1
+            totals[months // 12 if bucket == "year" else months // 3] += count
+        pairs = sorted(totals.items())
+
+    if bucket == "year":
+        return [(str(1970 + key), count) for key, count in pairs]
+    return [(f"{1970 + key // 4}-Q{key % 4 + 1}", count) for key, count in pairs]
+
+
+def print_age_report(ages, bucket):
+    """Print the line age histogram and the median line age per author and per directory."""
+    now = time.time()
+    times, weights = ages.overall()
+    if not times:
+        print("\nNo committed lines to analyse for line age.")
+        return
+
+    total = sum(weights)
+    print(f"\nLine age by {bucket} (author time):")
+    print(f"{'Period':<10} {'Lines':>10} {'Share':>8}")
+    print("-" * 60)
+    for label, count in age_histogram(times, weights, bucket):
+        share = count / total
+        print(f"{label:<10} {count:>10} {share * 100:>7.2f}% {'#' * round(share * 30)}")
+
+    for title, groups in (("Author", ages.by_author), ("Directory", ages.by_dir)):
+        print(f"\n{title:<30} {'Lines':>10} {'Median age (days)':>18} {'Median date':>12}")
+        print("-" * 73)
+        rows = []
+        for name, (t, w) in groups.items():
+            if t:
+                rows.append((name, sum(w), weighted_median(t, w)))
+        for name, count, median in sorted(rows, key=lambda row: -row[1]):
+            age_days = (now - median) / 86400
+            print(f"{name:<30} {count:>10} {age_days:>18.1f} {time.strftime('%Y-%m-%d', time.gmtime(median)):>12}")
+
+
+# ----------------------------------
+# OUTPUT SINKS
+# ----------------------------------
+# This section implements --format: one machine-readable record per file is written and flushed
+# as soon as the file's result is known, followed by a summary record, so consumers can process
+# a long run while it is still going and nothing per-file is kept in memory.
+
+class NdjsonSink:
+    """
+    Writes newline-delimited JSON: one {"type": "file", ...} object per file and a final
+    {"type": "summary", ...} object with the per-author totals.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def _emit(self, record):
+        self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+    def write_file(self, rel_path, result):
+        file_counter, _, not_committed, revisions = result
+        self._emit({
+            "type": "file",
+            "path": rel_path.replace(os.sep, "/"),
+            "authors": file_counter,
+            "not_committed": not_committed,
+            "revisions": revisions,
+        })
+
+    def close(self, stats):
+        self._emit({
+            "type": "summary",
+            "files": stats.files_scanned,
+            "authors": {author: {"lines": lines, "touched": stats.touched.get(author, 0)}
+                        for author, lines in stats.lines.most_common()},
+            "not_committed": stats.not_committed,
+        })
+
+
+class CsvSink:
+    """
+    Writes CSV rows of record,path,author,lines,touched: one "file" row per author of each file
+    (plus a 'Not Committed Yet' row when the file has uncommitted lines) and "summary" rows with
+    the per-author totals at the end.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.writer = csv.writer(stream)
+        self.writer.writerow(["record", "path", "author", "lines", "touched"])
+
+    def write_file(self, rel_path, result):
+        file_counter, _, not_committed, _ = result
+        path = rel_path.replace(os.sep, "/")
+        rows = [["file", path, author, lines, ""] for author, lines in file_counter.most_common()]
+        if not_committed or not rows:
+            rows.append(["file", path, NOT_COMMITTED_AUTHOR, not_committed, ""])
+        self.writer.writerows(rows)
+        self.stream.flush()
+
+    def close(self, stats):
+        for author, lines in stats.lines.most_common():
+            self.writer.writerow(["summary", "", author, lines, stats.touched.get(author, 0)])
+        self.writer.writerow(["summary", "", NOT_COMMITTED_AUTHOR, stats.not_committed, ""])
+        self.stream.flush()
+
+
+OUTPUT_SINKS = {"ndjson": NdjsonSink, "csv": CsvSink}
+
+
+# ----------------------------------
+# PROFILING
+# ----------------------------------
+# This section implements --profile: per-file stage timings, a slowest-files report and a
+# machine-readable dump, to show whether time goes to process spawns, git itself or Python.
+
+class BlameProfiler:
+    """
+    Collects one timing record per blamed file (cache hits are not blamed and not recorded).
+    Times are in seconds: queue (thread-pool wait before a worker picked the file up), spawn,
+    git (wall time until git exited), parse (Python CPU time while reading git's output),
+    attribute (resolving commits to authors) and total; plus bytes and lines read.
+    """
+
+    STAGES = ("queue", "spawn", "git", "parse", "attribute", "total")
+
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def record(self, file, timings):
+        entry = dict(timings, path=os.path.relpath(file, os.getcwd()).replace(os.sep, "/"))
+        with self._lock:
+            self.records.append(entry)
+
+    def write_dump(self, path):
+        """Write all records as JSON, slowest first, with per-stage sums."""
+        records = sorted(self.records, key=lambda r: -r["total"])
+        sums = {stage: sum(r.get(stage, 0.0) for r in records) for stage in self.STAGES}
+        sums.update(bytes=sum(r.get("bytes", 0) for r in records), lines=sum(r.get("lines", 0) for r in records))
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump({"files": len(records), "sums": sums, "records": records}, fh, indent=1)
+
+    def print_report(self, top):
+        """Print the per-stage time sums and the *top* slowest files."""
+        records = sorted(self.records, key=lambda r: -r["total"])
+        print(f"\nProfile of {len(records)} blamed files (stage sums, seconds):")
+        print("  " + "  ".join(f"{stage}={sum(r.get(stage, 0.0) for r in records):.3f}" for stage in self.STAGES))
+        print(f"\n{'Slowest files':<50} {'Total ms':>9} {'Queue':>8} {'Spawn':>7} {'Git':>8} {'Parse':>7} {'Bytes':>11} {'Lines':>8}")
+        print("-" * 115)
+        for r in records[:top]:
+            path = r["path"] if len(r["path"]) <= 50 else "..." + r["path"][-47:]
+            print(f"{path:<50} {r['total'] * 1000:>9.1f} {r['queue'] * 1000:>8.1f} {r.get('spawn', 0) * 1000:>7.1f} "
+                  f"{r.get('git', 0) * 1000:>8.1f} {r.get('parse', 0) * 1000:>7.1f} {r.get('bytes', 0):>11} "
+                  f"{r.get('lines', 0):>8}")
 
 
 # ----------------------------------
@@ -225,40 +1729,113 @@ def compute_blame_stats_parallel(files, max_workers):
 # ----------------------------------
 # This section is responsible for updating the terminal display with progress information.
 
-def print_progress(current_file, files_scanned, total_files, overall_lines, overall_touched, overall_not_committed):
+def format_progress(stats, cache=None, max_lines=None):
     """
-    Clears the terminal screen and prints a progress update:
+    Build the lines of a progress report:
       - A header comment about the application.
       - The current file being processed.
       - The number and percentage of files scanned.
+      - The blame cache hit/miss counts, if a cache is in use.
       - The cumulative 'Not Committed Yet' lines.
       - A table with authors, their committed line counts, files touched, and the percentage of committed lines.
+    If max_lines is given, the author table is cut short so the report fits in that many lines.
     """
-    # Cross-platform clear screen command.
-    os.system('cls' if os.name == 'nt' else 'clear')
+    files_scanned, total_files = stats.files_scanned, stats.total_files
+    pct = (files_scanned / total_files) * 100 if total_files else 0
+    lines = [
+        "# Git Blame Statistics Application v3.0",
+        "# Temporary progress update (replaceable output):",
+        "",
+        f"Scanned {files_scanned} of {total_files} files ({pct:>6.2f}% completed).",
+        f"Currently processing file: {stats.current_file}",
+        "",
+    ]
+    if cache:
+        lines += [f"Cache: {cache.hits} hits, {cache.misses} misses", ""]
+    lines += [f"Not Committed Yet lines: {stats.not_committed}", ""]
+    rows = None if max_lines is None else max_lines - len(lines)
+    return lines + format_author_table(stats.lines, stats.touched, rows)
 
-    print("# Git Blame Statistics Application v3.0")
-    print("# Temporary progress update (replaceable output):\n")
 
-    pct = (files_scanned / total_files) * 100 if total_files else 0
-    print(f"Scanned {files_scanned} of {total_files} files ({pct:>6.2f}% completed).")
-    print(f"Currently processing file: {current_file}\n")
-
-    print(f"Not Committed Yet lines: {overall_not_committed}\n")
-
-    total_committed = sum(overall_lines.values())
-    if total_committed:
-        print(f"{'Author':<30} {'Lines':>8} {'Touched':>8} {'Percentage':>12}")
-        print("-" * 60)
-        # Display each author (sorted by line count in descending order)
-        for author, lines in overall_lines.most_common():
-            touched = overall_touched.get(author, 0)
-            percentage = (lines / total_committed) * 100
-            print(f"{author:<30} {lines:>8} {touched:>8} {percentage:>11.2f}%")
-    else:
-        print("No committed lines processed yet.")
+def format_author_table(author_lines, author_touched, max_lines=None):
+    """
+    Build the lines of the author table: committed line counts, files touched and the percentage
+    of committed lines per author. If max_lines is given, the table is cut short to fit.
+    """
+    total_committed = sum(author_lines.values())
+    if not total_committed:
+        return ["No committed lines processed yet."]
+
+    lines = [f"{'Author':<30} {'Lines':>8} {'Touched':>8} {'Percentage':>12}", "-" * 60]
+    # Display each author (sorted by line count in descending order)
+    authors = author_lines.most_common()
+    hidden = 0
+    if max_lines is not None and len(lines) + len(authors) > max_lines:
+        shown = max(max_lines - len(lines) - 1, 0)
+        hidden = len(authors) - shown
+        authors = authors[:shown]
+    for author, count in authors:
+        touched = author_touched.get(author, 0)
+        percentage = (count / total_committed) * 100
+        lines.append(f"{author:<30} {count:>8} {touched:>8} {percentage:>11.2f}%")
+    if hidden:
+        lines.append(f"... and {hidden} more authors")
+    return lines
 
-    sys.stdout.flush()
+
+class ProgressRenderer:
+    """
+    Background thread that reports progress from snapshots of a BlameStats object.
+    On a terminal the report is redrawn in place with ANSI cursor control every RENDER_INTERVAL
+    seconds and cut to the terminal height. Otherwise (CI logs, pipes) a single status line is
+    printed every QUIET_RENDER_INTERVAL seconds. Either way the full report is printed once
+    when the renderer stops. Use as a context manager around the work being reported.
+    Progress goes to stderr when the stats stream machine-readable records to stdout.
+    """
+
+    def __init__(self, stats, cache=None, stream=None):
+        self.stats = stats
+        self.cache = cache
+        if stream is None:
+            stream = sys.stderr if stats.sink is not None and stats.sink.stream is sys.stdout else sys.stdout
+        self.stream = stream
+        self.live = self.stream.isatty()
+        self.interval = RENDER_INTERVAL if self.live else QUIET_RENDER_INTERVAL
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="blame-progress", daemon=True)
+        self._drawn = 0   # Number of lines of the previous in-place frame.
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self._draw(final=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            if self.live:
+                self._draw(final=False)
+            else:
+                snap = self.stats.snapshot()
+                pct = (snap.files_scanned / snap.total_files) * 100 if snap.total_files else 0
+                self.stream.write(f"Scanned {snap.files_scanned} of {snap.total_files} files ({pct:.2f}%).\n")
+                self.stream.flush()
+
+    def _draw(self, final):
+        snap = self.stats.snapshot()
+        if self.live and not final:
+            columns, rows = shutil.get_terminal_size()
+            lines = [line[:columns - 1] for line in format_progress(snap, self.cache, rows - 1)]
+        else:
+            lines = format_progress(snap, self.cache)
+        # Move to the first line of the previous frame and clear everything below it.
+        prefix = f"\x1b[{self._drawn}F\x1b[J" if self.live and self._drawn else ""
+        self.stream.write(prefix + "\n".join(lines) + "\n")
+        self.stream.flush()
+        self._drawn = len(lines)
 
 
 # ----------------------------------
@@ -272,9 +1849,25 @@ def parse_args():
     - paths: Optional list of files and/or directories to filter the tracked files.
     - --filter (-f): Alternate option to supply a list of files and/or directories for filtering.
     - --ignore (-i): Optional list of file extension patterns to ignore.
+    - --include / --exclude: Glob patterns (relative to the repository root) to select or drop files.
+    - --pathspec: Raw git pathspecs to select files.
+    - --max-file-size / --no-skip / --list-skipped: Control the skipping of binary, generated and oversized files.
+    - --timeout: Kill a single git blame after this many seconds.
     - --root (-r): Override the repository root.
+    - --history: Report author totals at sampled revisions (tags, monthly/quarterly/yearly, or given revisions).
+    - --repos / --submodules: Blame several repositories, and/or their submodules, on one shared worker pool.
     - --list (-l): List all files that would be processed and exit.
-    - --parallel (-p): Process files using the parallel method with a specified number of threads (1-1024).
+    - --parallel (-p): Process files using the parallel method with a specified number of threads (1-1024),
+                       or 0 to adapt the number of threads to the measured CPU saturation.
+    - --no-cache: Blame every file again instead of reusing results from the on-disk cache.
+    - --cache-size: Maximum number of per-file results kept in the cache.
+    - --since-last-run: Only re-blame files changed since the previous run with this flag.
+    - --author-key: Identify authors by mailmap-canonical name, email, or both.
+    - --rollup: Print a directory's breakdown from the rollup saved by the last run, without blaming.
+    - --top-dirs / --rank-by: Print the top N directories of the saved rollup, without blaming.
+    - --age / --age-bucket / --age-depth: Report line age histograms and medians per author and directory.
+    - --format / --output: Stream one NDJSON or CSV record per file (and a summary) to stdout or a file.
+    - --profile / --profile-output: Time every stage of every blamed file and report the slowest files.
     """
     parser = argparse.ArgumentParser(
         description="Compute Git blame statistics for a Git repository."
@@ -296,12 +1889,77 @@ def parse_args():
         default=[],
         help="List of file extensions to ignore (e.g., .md .txt)."
     )
+    parser.add_argument(
+        "--include",
+        metavar="GLOB",
+        nargs="*",
+        default=[],
+        help="Only process files matching these globs, relative to the repository root (e.g., 'src/**/*.py')."
+    )
+    parser.add_argument(
+        "--exclude",
+        metavar="GLOB",
+        nargs="*",
+        default=[],
+        help="Skip files matching these globs, relative to the repository root (e.g., 'vendor/**')."
+    )
+    parser.add_argument(
+        "--pathspec",
+        metavar="SPEC",
+        nargs="*",
+        default=[],
+        help="Raw git pathspecs selecting the files to process (e.g., ':(icase)docs')."
+    )
+    parser.add_argument(
+        "--max-file-size",
+        metavar="BYTES",
+        type=int,
+        default=MAX_BLAME_FILE_SIZE,
+        help=f"Skip files whose blob is larger than BYTES; 0 disables the limit (default: {MAX_BLAME_FILE_SIZE})."
+    )
+    parser.add_argument(
+        "--no-skip",
+        action="store_true",
+        help="Blame every selected file, including binary, generated and oversized ones."
+    )
+    parser.add_argument(
+        "--list-skipped",
+        action="store_true",
+        help="List the files that would be skipped (with the reason) and exit."
+    )
+    parser.add_argument(
+        "--timeout",
+        metavar="SECONDS",
+        type=float,
+        default=None,
+        help="Kill git blame for a single file after SECONDS and skip that file."
+    )
     parser.add_argument(
         "-r", "--root",
         metavar="PATH",
         default=None,
         help="Optional: specify the repository root. If not provided, the repository root is determined automatically."
     )
+    parser.add_argument(
+        "--history",
+        metavar="SPEC",
+        nargs="+",
+        default=None,
+        help="Report author totals at sampled revisions instead of HEAD: 'tags', 'monthly', 'quarterly', "
+             "'yearly' and/or revisions. Writes one row per revision per author (CSV, or NDJSON with --format ndjson)."
+    )
+    parser.add_argument(
+        "--repos",
+        metavar="PATH",
+        nargs="+",
+        default=None,
+        help="Batch mode: blame every repository containing one of these paths on one shared worker pool."
+    )
+    parser.add_argument(
+        "--submodules",
+        action="store_true",
+        help="Batch mode: also blame every initialized submodule (recursively) of the repositories."
+    )
     parser.add_argument(
         "-l", "--list",
         action="store_true",
@@ -312,29 +1970,262 @@ def parse_args():
         metavar="N",
         type=int,
         default=None,
-        help="Process files using the parallel method with N threads (1-1024)."
+        help="Process files using the parallel method with N threads (1-1024), or 0 to adapt the thread count automatically."
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write the blame result cache stored under .git/blameall/."
+    )
+    parser.add_argument(
+        "--cache-size",
+        metavar="N",
+        type=int,
+        default=CACHE_MAX_ENTRIES,
+        help=f"Maximum number of per-file results kept in the blame cache (default: {CACHE_MAX_ENTRIES})."
+    )
+    parser.add_argument(
+        "--since-last-run",
+        action="store_true",
+        help="Only re-blame files changed since the last run made with this flag and patch its saved totals."
+    )
+    parser.add_argument(
+        "--author-key",
+        choices=["name", "email", "both"],
+        default="name",
+        help="Identify authors by their .mailmap-canonical name, email, or both (default: name)."
+    )
+    parser.add_argument(
+        "--rollup",
+        metavar="DIR",
+        nargs="?",
+        const=".",
+        default=None,
+        help="Print the author breakdown of DIR (default: repository root) from the rollup saved by the last run."
+    )
+    parser.add_argument(
+        "--top-dirs",
+        metavar="N",
+        type=int,
+        default=None,
+        help="Print the top N directories from the rollup saved by the last run."
+    )
+    parser.add_argument(
+        "--rank-by",
+        choices=["lines", "churn", "concentration"],
+        default="lines",
+        help="Ranking used by --top-dirs: committed lines, churn (surviving revisions) or top-author share (default: lines)."
+    )
+    parser.add_argument(
+        "--age",
+        action="store_true",
+        help="Also report the age of blamed lines: a histogram and median age per author and per directory."
+    )
+    parser.add_argument(
+        "--age-bucket",
+        choices=["year", "quarter"],
+        default="year",
+        help="Histogram period used by --age (default: year)."
+    )
+    parser.add_argument(
+        "--age-depth",
+        metavar="N",
+        type=int,
+        default=1,
+        help="Number of path components that define a directory for --age (default: 1)."
+    )
+    parser.add_argument(
+        "--format",
+        choices=sorted(OUTPUT_SINKS),
+        default=None,
+        help="Stream one machine-readable record per file as it completes, then a summary record."
+    )
+    parser.add_argument(
+        "-o", "--output",
+        metavar="FILE",
+        default=None,
+        help="Write --format records to FILE instead of stdout (progress then stays on stdout)."
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="N",
+        type=int,
+        nargs="?",
+        const=20,
+        default=None,
+        help="Record per-file stage timings and print the N slowest files (default N: 20)."
+    )
+    parser.add_argument(
+        "--profile-output",
+        metavar="FILE",
+        default=None,
+        help="Where --profile writes its JSON timing dump (default: .git/blameall/profile.json)."
     )
-    return parser.parse_args()
+    args = parser.parse_args()
+    if (args.age or args.profile is not None) and args.format and not args.output:
+        parser.error("--age and --profile print text reports; use --output FILE together with --format.")
+    if args.age and args.since_last_run:
+        parser.error("--age cannot be combined with --since-last-run (line ages are not saved between runs).")
+    if args.history and (args.since_last_run or args.age or args.profile is not None or args.list_skipped
+                         or args.repos is not None or args.submodules):
+        parser.error("--history cannot be combined with --since-last-run, --age, --profile, --list-skipped "
+                     "or batch mode.")
+    if args.repos is not None or args.submodules:
+        if args.paths or args.filter or args.root:
+            parser.error("--repos/--submodules select whole repositories; use --include/--exclude to filter files.")
+        if (args.since_last_run or args.age or args.format or args.profile is not None
+                or args.rollup is not None or args.top_dirs is not None):
+            parser.error("--repos/--submodules cannot be combined with --since-last-run, --age, --format, "
+                         "--profile, --rollup or --top-dirs.")
+    return args
+
+
+def get_max_workers(parallel):
+    """Validate the --parallel thread count; returns None (adaptive) for 0 or an invalid count."""
+    if 1 <= parallel <= 1024:
+        return parallel
+    if parallel != 0:
+        print(f"Invalid number of threads specified: {parallel}. Using adaptive threads count.")
+    return None
+
+
+def main_batch(args):
+    """
+    Batch mode: blame several repositories (and/or their submodules) in one run.
+    Files are selected, classified and looked up in the cache per repository, then blamed on one
+    shared worker pool (adaptive unless --parallel is given). Prints per-repository and combined tables.
+    """
+    roots = find_repositories(args.repos or [args.cwd], args.submodules)
+    if not roots:
+        print("No repositories found to process.")
+        sys.exit(1)
+
+    global BLAME_TIMEOUT
+    BLAME_TIMEOUT = args.timeout
+    pathspecs = build_pathspecs((), args.include, args.exclude, args.pathspec)
+    runs, sizes, skipped = [], {}, {}
+    try:
+        for root in roots:
+            os.chdir(root)
+            files = get_git_tracked_files(args.ignore, pathspecs)
+            if not args.no_skip:
+                files, repo_skipped = classify_files(files, args.max_file_size)
+                skipped.update(repo_skipped)
+            if args.list:
+                for f in sorted(files):
+                    print(f)
+                continue
+            sizes.update(get_blob_sizes())
+            cache = None if args.no_cache or args.list_skipped else open_blame_cache(args.cache_size)
+            runs.append(RepoRun(root, sorted(files), CommitResolver(args.author_key, root), cache,
+                                BlameStats(len(files), root=root)))
+        if args.list:
+            sys.exit(0)
+        if args.list_skipped:
+            for f in sorted(skipped):
+                reason, size = skipped[f]
+                print(f"{reason:<10} {size:>12} {f}")
+            print(format_skip_summary(skipped), file=sys.stderr)
+            sys.exit(0)
+        if skipped:
+            print(format_skip_summary(skipped), file=sys.stderr)
+
+        max_workers = get_max_workers(args.parallel) if args.parallel is not None else None
+        combined = compute_batch_blame_stats(runs, max_workers, sizes)
+    finally:
+        for run in runs:
+            run.resolver.close()
+            if run.cache:
+                run.cache.close()
+
+    for run in runs:
+        os.chdir(run.root)
+        save_rollup(os.path.join(get_git_dir(), "blameall", "rollup.json"), get_head_commit(), run.stats.tree)
+    print_batch_report(runs, combined)
+
+
+def main_history(args, pathspecs):
+    """
+    History mode: blame the selected files at every sampled revision (blaming each unchanged
+    file version only once) and write one row per revision per author. With --list, only the
+    sampled revisions are printed.
+    """
+    samples = get_history_samples(args.history)
+    if not samples:
+        print("No revisions found to sample.")
+        sys.exit(0)
+    if args.list:
+        for label, sha, timestamp in samples:
+            print(f"{label:<20} {sha} {time.strftime('%Y-%m-%d', time.gmtime(timestamp))}")
+        sys.exit(0)
+
+    max_workers = get_max_workers(args.parallel) if args.parallel is not None else 1
+    resolver = CommitResolver(args.author_key)
+    try:
+        history = compute_history_stats(samples, resolver, pathspecs, args.ignore, max_workers,
+                                        None if args.no_skip else args.max_file_size)
+    finally:
+        resolver.close()
+
+    stream = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        write_history(history, stream, args.format or "csv")
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
 
 
 def main():
     args = parse_args()
+    args.cwd = os.getcwd()  # Without --root, paths given on the command line are relative to this directory.
+    if args.repos is not None or args.submodules:
+        main_batch(args)
+        return
 
     # Determine and switch to repository root.
     repo_root = os.path.abspath(args.root) if args.root else get_repo_root()
     os.chdir(repo_root)
+    # With --root, filter paths and the rollup directory are relative to the repository root.
+    base_dir = repo_root if args.root else args.cwd
 
-    ignore_exts = args.ignore
+    # Rollup queries only read the saved tree.
+    rollup_path = os.path.join(get_git_dir(), "blameall", "rollup.json")
+    if args.rollup is not None or args.top_dirs is not None:
+        head, tree = load_rollup(rollup_path)
+        if args.rollup is not None:
+            rel_dir = os.path.relpath(os.path.abspath(os.path.join(base_dir, args.rollup)), repo_root)
+            print_rollup(tree, head, "" if rel_dir == "." else rel_dir)
+        if args.top_dirs is not None:
+            if args.rollup is not None:
+                print()
+            print_top_directories(tree, args.top_dirs, args.rank_by)
+        sys.exit(0)
 
-    # Always start with all Git tracked files.
-    tracked_files = get_git_tracked_files(ignore_exts)
+    ignore_exts = args.ignore
+    global BLAME_TIMEOUT
+    BLAME_TIMEOUT = args.timeout
 
-    # Merge positional filter paths and filter paths provided by the -f/--filter option.
+    # Merge positional filter paths and filter paths provided by the -f/--filter option,
+    # and let 'git ls-files' apply them together with the globs and pathspecs.
     filter_paths = args.paths + args.filter
-    files_to_process = (
-        filter_tracked_files(tracked_files, filter_paths)
-        if filter_paths else tracked_files
-    )
+    pathspecs = build_pathspecs(filter_paths, args.include, args.exclude, args.pathspec, base_dir=base_dir)
+    if args.history:
+        main_history(args, pathspecs)
+        return
+    files_to_process = get_git_tracked_files(ignore_exts, pathspecs)
+
+    # Route binaries, generated files and oversized blobs to a skip list before blaming anything.
+    skipped = {}
+    if not args.no_skip:
+        files_to_process, skipped = classify_files(files_to_process, args.max_file_size)
+    if args.list_skipped:
+        for f in sorted(skipped):
+            reason, size = skipped[f]
+            print(f"{reason:<10} {size:>12} {f}")
+        print(format_skip_summary(skipped), file=sys.stderr)
+        sys.exit(0)
+    if skipped:
+        print(format_skip_summary(skipped), file=sys.stderr)
 
     if not files_to_process:
         print("No files found to process.")
@@ -346,16 +2237,56 @@ def main():
             print(f)
         sys.exit(0)
 
-    if args.parallel is not None:
-        # Validate thread count
-        if 1 <= args.parallel <= 1024:
-            max_workers = args.parallel
+    # In incremental mode, start from the saved totals and only blame what changed.
+    resolver = CommitResolver(args.author_key)
+    identity = resolver.identity_signature()
+    stats = None
+    files = list(files_to_process)
+    if args.since_last_run:
+        state_path = os.path.join(get_git_dir(), "blameall", "last_run.json")
+        head = get_head_commit()
+        stats, files = plan_incremental_run(load_last_run(state_path, identity), files_to_process)
+
+    if args.age:
+        stats = BlameStats(len(files))
+        stats.ages = AgeStats(resolver, args.age_depth)
+
+    sink_stream = None
+    if args.format:
+        sink_stream = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+        stats = stats or BlameStats(len(files))
+        stats.sink = OUTPUT_SINKS[args.format](sink_stream)
+
+    if args.profile is not None:
+        stats = stats or BlameStats(len(files))
+        stats.profiler = BlameProfiler()
+
+    cache = None if args.no_cache else open_blame_cache(args.cache_size)
+    try:
+        if args.parallel is not None:
+            stats = compute_blame_stats_parallel(files, get_max_workers(args.parallel), resolver, cache, stats)
         else:
-            print(f"Invalid number of threads specified: {args.parallel}. Using default threads count.")
-            max_workers = (os.cpu_count() or 4) * 2
-        compute_blame_stats_parallel(list(files_to_process), max_workers)
-    else:
-        compute_blame_stats(list(files_to_process))
+            stats = compute_blame_stats(files, resolver, cache, stats)
+        if stats and stats.sink:
+            stats.sink.close(stats)
+    finally:
+        resolver.close()
+        if cache:
+            cache.close()
+        if sink_stream not in (None, sys.stdout):
+            sink_stream.close()
+
+    if stats:
+        save_rollup(rollup_path, get_head_commit(), stats.tree)
+    if stats and stats.ages is not None:
+        print_age_report(stats.ages, args.age_bucket)
+    if stats and stats.profiler is not None:
+        stats.profiler.print_report(args.profile)
+        dump_path = args.profile_output or os.path.join(get_git_dir(), "blameall", "profile.json")
+        stats.profiler.write_dump(dump_path)
+        print(f"\nTiming dump written to {dump_path}")
+    if args.since_last_run and stats and head:
+        save_last_run(state_path, head, identity, stats)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+=============================================================
+ Git Blame Statistics Benchmark
+=============================================================
+
+ Author:  JessyJP
+
+ Description:
+   Measures the throughput of the blameall.py pipeline on a
+   synthetic Git repository. The repository is generated with
+   `git fast-import` from a fixed seed, so the same parameters
+   always produce the same history. Every configuration runs in
+   its own Python process so peak memory is measured in isolation.
+
+ Measurements (per configuration):
+   - Files per second and blamed lines per second.
+   - Peak RSS of the Python process and of its git children.
+   - Per-file latency percentiles (p50, p90, p99, max).
+
+ Usage:
+   # Generate a 2000-file repository and compare sequential vs parallel
+   ./blameall_benchmark.py --files 2000 --parallel 4 8 0
+
+   # Skewed file sizes, results saved for comparison with a later run
+   ./blameall_benchmark.py --files 5000 --lines 200 --size-skew 1.5 --json bench.json
+
+ Notes:
+   - Parallel setting 0 selects the adaptive worker count.
+   - The blame cache is not used, so every file is blamed.
+   - Peak RSS is only reported on platforms with the `resource` module.
+
+=============================================================
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from contextlib import redirect_stdout
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Add the current script directory to sys.path so blameall can be imported.
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, script_dir)
+
+import blameall
+
+
+# ----------------------------------
+# SYNTHETIC REPOSITORY
+# ----------------------------------
+# This section generates a reproducible repository with a configurable shape.
+
+def generate_repo(path, files, lines, commits, authors, size_skew=0.0, seed=1):
+    """
+    Create a Git repository at *path* through one 'git fast-import' stream:
+      - The first commit adds *files* files spread over nested directories.
+      - Every later commit, by a random one of *authors* authors, rewrites random line
+        ranges in about 5% of the files, so blame has to walk real history.
+    File sizes average *lines* lines; a positive *size_skew* draws them from a
+    log-normal distribution with that sigma, giving a few very large files.
+    An existing repository generated with the same parameters is reused.
+    """
+    params = {"files": files, "lines": lines, "commits": commits, "authors": authors,
+              "size_skew": size_skew, "seed": seed}
+    params_path = os.path.join(path, ".git", "benchmark-params.json")
+    try:
+        with open(params_path, encoding="utf-8") as fh:
+            if json.load(fh) == params:
+                return
+    except (OSError, ValueError):
+        pass
+
+    if os.path.exists(path) and os.listdir(path):
+        print(f"Error: {path} exists and was not generated with these parameters.")
+        sys.exit(1)
+    os.makedirs(path, exist_ok=True)
+    subprocess.check_call(["git", "init", "-q", "-b", "main", path])
+
+    rng = random.Random(seed)
+    names = [f"Author {i} <author{i}@example.com>" for i in range(authors)]
+    paths = [f"dir{i % 17}/sub{i % 5}/file{i}.txt" for i in range(files)]
+    if size_skew > 0:
+        sizes = [max(1, int(rng.lognormvariate(0, size_skew) * lines)) for _ in paths]
+    else:
+        sizes = [lines] * files
+    contents = [[f"line {n} of {p}" for n in range(size)] for p, size in zip(paths, sizes)]
+
+    proc = subprocess.Popen(["git", "fast-import", "--quiet"], cwd=path, stdin=subprocess.PIPE)
+    timestamp = 1_500_000_000
+
+    def emit_data(data):
+        payload = data.encode("utf-8")
+        proc.stdin.write(b"data %d\n" % len(payload) + payload + b"\n")
+
+    for number in range(1, commits + 1):
+        author = names[0] if number == 1 else rng.choice(names)
+        timestamp += rng.randint(600, 86400)
+        proc.stdin.write(f"commit refs/heads/main\nmark :{number}\n"
+                         f"author {author} {timestamp} +0000\ncommitter {author} {timestamp} +0000\n".encode("utf-8"))
+        emit_data(f"Synthetic commit {number}")
+        if number > 1:
+            proc.stdin.write(f"from :{number - 1}\n".encode("ascii"))
+            touched = rng.sample(range(files), max(1, files // 20))
+        else:
+            touched = range(files)
+        for index in touched:
+            body = contents[index]
+            if number > 1:
+                start = rng.randrange(len(body))
+                for n in range(start, min(len(body), start + rng.randint(1, 20))):
+                    body[n] = f"line {n} of {paths[index]} rev {number}"
+            proc.stdin.write(f"M 100644 inline {paths[index]}\n".encode("utf-8"))
+            emit_data("\n".join(body) + "\n")
+    proc.stdin.close()
+    if proc.wait() != 0:
+        print("Error: git fast-import failed.")
+        sys.exit(1)
+
+    subprocess.check_call(["git", "reset", "-q", "--hard", "main"], cwd=path)
+    with open(params_path, "w", encoding="utf-8") as fh:
+        json.dump(params, fh)
+
+
+# ----------------------------------
+# MEASUREMENT
+# ----------------------------------
+# This section runs one configuration of the pipeline and reports its measurements.
+
+def percentile(sorted_values, fraction):
+    """Return the value at *fraction* (0-1) of an ascending list, or 0.0 if it is empty."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def peak_rss_mb(who):
+    """Peak resident set size in MB for RUSAGE_SELF or RUSAGE_CHILDREN, or None if unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_configuration(repo, workers):
+    """
+    Blame every tracked file of *repo* with blameall's own compute functions and return the
+    measurements as a dict. workers=None runs compute_blame_stats, otherwise the parallel path
+    runs with that worker count (0 meaning adaptive).
+    """
+    os.chdir(repo)
+    files = sorted(blameall.get_git_tracked_files([]))
+    latencies = []
+    original = blameall.process_single_file
+
+    def timed_process_single_file(file, resolver, *args):
+        start = time.perf_counter()
+        try:
+            return original(file, resolver, *args)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    blameall.process_single_file = timed_process_single_file
+    resolver = blameall.CommitResolver()
+    start = time.perf_counter()
+    try:
+        # The progress report is not part of what is measured.
+        with redirect_stdout(io.StringIO()):
+            if workers is None:
+                stats = blameall.compute_blame_stats(files, resolver)
+            else:
+                stats = blameall.compute_blame_stats_parallel(files, workers or None, resolver)
+    finally:
+        elapsed = time.perf_counter() - start
+        resolver.close()
+        blameall.process_single_file = original
+
+    latencies.sort()
+    blamed_lines = sum(stats.lines.values()) + stats.not_committed
+    return {
+        "mode": "sequential" if workers is None else ("parallel-adaptive" if workers == 0 else f"parallel-{workers}"),
+        "files": len(files),
+        "lines": blamed_lines,
+        "seconds": round(elapsed, 4),
+        "files_per_sec": round(len(files) / elapsed, 2) if elapsed else None,
+        "lines_per_sec": round(blamed_lines / elapsed, 2) if elapsed else None,
+        "peak_rss_mb": peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        "peak_child_rss_mb": peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 3),
+            "p90": round(percentile(latencies, 0.90) * 1000, 3),
+            "p99": round(percentile(latencies, 0.99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+    }
+
+
+def run_isolated(repo, workers):
+    """Run one configuration in a fresh Python process and return its measurements."""
+    cmd = [sys.executable, os.path.abspath(__file__), "--run-one", repo]
+    if workers is not None:
+        cmd += ["--workers", str(workers)]
+    output = subprocess.check_output(cmd, text=True)
+    return json.loads(output.splitlines()[-1])
+
+
+def git_version():
+    return subprocess.check_output(["git", "--version"], text=True).strip()
+
+
+# ----------------------------------
+# MAIN
+# ----------------------------------
+# This section handles command-line argument parsing and the main execution flow.
+
+def parse_args():
+    """
+    Parse command-line arguments.
+    - --repo: Where the synthetic repository is generated (or reused).
+    - --files / --lines / --commits / --authors / --size-skew / --seed: Shape of the repository.
+    - --parallel: Worker counts to benchmark besides the sequential run (0 = adaptive).
+    - --no-sequential: Skip the sequential run.
+    - --json: Save all measurements to this file.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the blameall.py pipeline on a synthetic repository.")
+    parser.add_argument("--repo", default=os.path.join(os.getcwd(), "blameall-bench-repo"),
+                        help="Directory of the synthetic repository (default: ./blameall-bench-repo).")
+    parser.add_argument("--files", type=int, default=1000, help="Number of files (default: 1000).")
+    parser.add_argument("--lines", type=int, default=100, help="Average lines per file (default: 100).")
+    parser.add_argument("--commits", type=int, default=50, help="Number of commits (default: 50).")
+    parser.add_argument("--authors", type=int, default=8, help="Number of distinct authors (default: 8).")
+    parser.add_argument("--size-skew", type=float, default=0.0,
+                        help="Sigma of a log-normal file size distribution; 0 gives equal sizes (default: 0).")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed of the generator (default: 1).")
+    parser.add_argument("--parallel", type=int, nargs="*", default=[4, 0],
+                        help="Worker counts for the parallel runs, 0 for adaptive (default: 4 0).")
+    parser.add_argument("--no-sequential", action="store_true", help="Skip the sequential run.")
+    parser.add_argument("--json", metavar="FILE", default=None, help="Save the measurements as JSON to FILE.")
+    parser.add_argument("--run-one", metavar="REPO", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--workers", type=int, default=None, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # Child process: measure a single configuration and print it as JSON.
+    if args.run_one:
+        print(json.dumps(run_configuration(args.run_one, args.workers)))
+        return
+
+    repo = os.path.abspath(args.repo)
+    print(f"Preparing synthetic repository in {repo} ...")
+    start = time.perf_counter()
+    generate_repo(repo, args.files, args.lines, args.commits, args.authors, args.size_skew, args.seed)
+    print(f"Repository ready in {time.perf_counter() - start:.1f}s.\n")
+
+    configurations = ([] if args.no_sequential else [None]) + args.parallel
+    results = []
+    print(f"{'Mode':<20} {'Seconds':>9} {'Files/s':>10} {'Lines/s':>12} {'RSS MB':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    print("-" * 81)
+    for workers in configurations:
+        result = run_isolated(repo, workers)
+        results.append(result)
+        rss = f"{result['peak_rss_mb']:.1f}" if result["peak_rss_mb"] is not None else "n/a"
+        print(f"{result['mode']:<20} {result['seconds']:>9.2f} {result['files_per_sec']:>10.1f} "
+              f"{result['lines_per_sec']:>12.1f} {rss:>8} {result['latency_ms']['p50']:>8.2f} "
+              f"{result['latency_ms']['p99']:>8.2f}")
+
+    if args.json:
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "machine": {
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "python": platform.python_version(),
+                "git": git_version(),
+            },
+            "repository": {"path": repo, "files": args.files, "lines": args.lines, "commits": args.commits,
+                           "authors": args.authors, "size_skew": args.size_skew, "seed": args.seed},
+            "results": results,
+        }
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"\nSaved results to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+import os
+import re
+import json
+import sqlite3
+import subprocess
+import logging
+from array import array
+
+from git_operations import CommitRecord, load_commits, run_command, get_git_dir
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Number of candidate ids inserted per statement when narrowing a search.
+CANDIDATE_BATCH = 10000
+# Above this share of all commits, candidates are filtered while streaming commits newest first,
+# which stops as soon as enough matches are found, instead of being joined in SQLite.
+CANDIDATE_STREAM_SHARE = 0.05
+# Once this few candidates remain, checking them directly is cheaper than intersecting more posting lists.
+CANDIDATE_CHECK_LIMIT = 1000
+
+# One escape sequence of a regular expression, including the digits or name of \x, \u, \U, \N and numeric escapes.
+REGEX_ESCAPE = re.compile(r"\\(?:x[0-9a-fA-F]{0,2}|u[0-9a-fA-F]{0,4}|U[0-9a-fA-F]{0,8}|N\{[^}]*\}?|[0-9]{1,3}|.)", re.DOTALL)
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def required_literals(pattern):
+    """
+    Return literal substrings that every match of the regular expression *pattern* must contain.
+    Only top-level literal runs are used; groups, character classes, escapes like \\w and
+    optional characters end a run. Returns [] when nothing can be derived safely
+    (top-level alternation, verbose mode).
+    """
+    if re.compile(pattern).flags & re.VERBOSE:
+        return []
+    literals = []
+    run = []
+    depth = 0
+    i = 0
+    n = len(pattern)
+
+    def flush():
+        if depth == 0 and len(run) >= 3:
+            literals.append("".join(run))
+        run.clear()
+
+    while i < n:
+        c = pattern[i]
+        token = None
+        if c == "\\" and i + 1 < n:
+            # Escaped punctuation is a literal. Escaped letters and digits are classes, anchors,
+            # backreferences or character codes; the whole escape is skipped and ends the run.
+            escape = REGEX_ESCAPE.match(pattern, i).group()
+            token = escape[1] if not escape[1].isalnum() else None
+            i += len(escape)
+        elif c == "[":
+            i += 1
+            if i < n and pattern[i] == "^":
+                i += 1
+            if i < n and pattern[i] == "]":
+                i += 1
+            while i < n and pattern[i] != "]":
+                i += 2 if pattern[i] == "\\" else 1
+            i += 1
+        elif c in "*?{":
+            # The previous character is optional: drop it from the run.
+            if c == "{":
+                i = pattern.find("}", i) + 1 or n
+            else:
+                i += 1
+            if run:
+                run.pop()
+            flush()
+            if i < n and pattern[i] in "?+":  # Lazy or possessive suffix.
+                i += 1
+            continue
+        elif c == "+":
+            i += 1
+            flush()
+            if i < n and pattern[i] in "?+":
+                i += 1
+            continue
+        elif c == "|" and depth == 0:
+            return []
+        else:
+            if c == "(":
+                depth += 1
+            elif c == ")":
+                depth -= 1
+            elif c not in ".^$|":
+                token = c
+            i += 1
+        if token is None or depth > 0:
+            flush()
+        else:
+            run.append(token)
+    flush()
+    return literals
+
+class CommitIndex:
+    """
+    Persistent trigram index of the commits of one repository, stored in <git-dir>/gitfind/.
+    Every commit is stored with the fields needed to display it, and each trigram of its
+    lowercased message maps to a posting list of commit ids.
+    update() only indexes commits that are not reachable from the tips it recorded last time,
+    and removes the commits that are no longer reachable from any ref.
+    """
+
+    SCHEMA_VERSION = 3
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db = sqlite3.connect(db_path)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+            self._drop()
+            self.db.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        self._create()
+        self.db.execute("CREATE TEMP TABLE candidates (id INTEGER PRIMARY KEY)")
+        self.db.commit()
+
+    def _create(self):
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS commits ("
+            " id INTEGER PRIMARY KEY, hexsha TEXT NOT NULL UNIQUE, timestamp INTEGER NOT NULL,"
+            " date TEXT NOT NULL, author TEXT NOT NULL, subject TEXT NOT NULL, body TEXT NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS commits_timestamp ON commits (timestamp)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS trigrams (gram TEXT PRIMARY KEY, ids BLOB NOT NULL) WITHOUT ROWID")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    def _drop(self):
+        for table in ("commits", "trigrams", "meta"):
+            self.db.execute(f"DROP TABLE IF EXISTS {table}")
+
+    def _get_tips(self):
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'tips'").fetchone()
+        return json.loads(row[0]) if row else []
+
+    def update(self):
+        """Index the commits added since the last update. Returns the number of new commits."""
+        refs, _ = run_command("git rev-parse --all")
+        head, _ = run_command("git rev-parse --verify -q HEAD")
+        tips = sorted(set(refs.split()) | set(head.split()))
+        old_tips = self._get_tips()
+        if tips == old_tips:
+            return 0
+
+        logger.debug(f"Updating commit index from {len(old_tips)} known tips.")
+        commits = None
+        if old_tips and self._remove_unreachable(old_tips, tips):
+            commits = load_commits(stdin_revs=[f"^{tip}" for tip in old_tips])
+        if commits is None:
+            # First run, or a recorded tip no longer exists (e.g. after a gc): index everything again.
+            old_tips = []
+            self._drop()
+            self._create()
+            commits = load_commits() or []
+
+        postings = {}
+        added = 0
+        # Oldest first, so ids grow with recency and break timestamp ties like 'git log' order does.
+        for commit in reversed(commits):
+            body = commit.message[len(commit.subject) + 2:]
+            cursor = self.db.execute(
+                "INSERT OR IGNORE INTO commits (hexsha, timestamp, date, author, subject, body) VALUES (?, ?, ?, ?, ?, ?)",
+                (commit.hexsha, commit.timestamp, commit.date, commit.author, commit.subject, body),
+            )
+            if cursor.rowcount != 1:
+                continue  # Already indexed (a ref was moved back and forth).
+            added += 1
+            for gram in trigrams(commit.message_lower):
+                ids = postings.get(gram)
+                if ids is None:
+                    ids = postings[gram] = array("I")
+                ids.append(cursor.lastrowid)
+
+        rows = []
+        for gram, ids in postings.items():
+            # A fresh index has no posting lists to extend.
+            row = self.db.execute("SELECT ids FROM trigrams WHERE gram = ?", (gram,)).fetchone() if old_tips else None
+            rows.append((gram, (row[0] if row else b"") + ids.tobytes()))
+        self.db.executemany("REPLACE INTO trigrams (gram, ids) VALUES (?, ?)", rows)
+        self.db.execute("REPLACE INTO meta (key, value) VALUES ('tips', ?)", (json.dumps(tips),))
+        self.db.commit()
+        logger.debug(f"Indexed {added} new commits.")
+        return added
+
+    def _remove_unreachable(self, old_tips, tips):
+        """
+        Delete the commits reachable from *old_tips* but from none of *tips* (deleted branches,
+        rewritten history). Returns False if git cannot list them, e.g. an old tip was gc'd.
+        Stale ids left in the posting lists are harmless: every candidate is checked against the commits table.
+        """
+        result = subprocess.run(["git", "rev-list", "--stdin"], input="".join(f"{tip}\n" for tip in old_tips) +
+                                "".join(f"^{tip}\n" for tip in tips), stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, text=True)
+        if result.returncode != 0:
+            return False
+        gone = result.stdout.split()
+        if gone:
+            logger.debug(f"Removing {len(gone)} commits that are no longer reachable.")
+            self.db.executemany("DELETE FROM commits WHERE hexsha = ?", [(sha,) for sha in gone])
+        return True
+
+    def _candidates(self, literals):
+        """Ids of the commits containing every trigram of *literals*, or None if nothing narrows the search."""
+        grams = set()
+        for literal in literals:
+            grams |= trigrams(literal.lower())
+        if not grams:
+            return None
+        grams = list(grams)
+        postings = []
+        for i in range(0, len(grams), 500):
+            chunk = grams[i:i + 500]
+            postings += self.db.execute(
+                f"SELECT ids FROM trigrams WHERE gram IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+        if len(postings) < len(grams):
+            return set()  # Some trigram occurs in no commit at all.
+        postings.sort(key=lambda row: len(row[0]))
+        candidates = set(array("I", postings[0][0]))
+        for (blob,) in postings[1:]:
+            if len(candidates) <= CANDIDATE_CHECK_LIMIT:
+                break
+            candidates.intersection_update(array("I", blob))
+        return candidates
+
+    def search(self, query, num_commits, regex=False):
+        """
+        Return up to *num_commits* CommitRecord, newest first, whose message contains *query*
+        (case-insensitive), or matches the regular expression *query*, exactly as filter_commits() matches. The posting lists of the
+        query's trigrams (for a regex, of its required literals) narrow down the commits that are checked.
+        """
+        if regex:
+            pattern = re.compile(query)
+            candidates = self._candidates(required_literals(query))
+        else:
+            query_lower = query.lower()
+            candidates = self._candidates([query])
+
+        if candidates is not None and not candidates:
+            return []
+        total = self.db.execute("SELECT MAX(id) FROM commits").fetchone()[0] or 0
+        if candidates is None or len(candidates) > CANDIDATE_STREAM_SHARE * total:
+            rows = self.db.execute(
+                "SELECT id, hexsha, timestamp, date, author, subject, body FROM commits ORDER BY timestamp DESC, id DESC"
+            )
+        else:
+            self.db.execute("DELETE FROM candidates")
+            ids = [(commit_id,) for commit_id in candidates]
+            for i in range(0, len(ids), CANDIDATE_BATCH):
+                self.db.executemany("INSERT INTO candidates (id) VALUES (?)", ids[i:i + CANDIDATE_BATCH])
+            # CROSS JOIN makes SQLite loop over the few candidates instead of over all commits.
+            rows = self.db.execute(
+                "SELECT id, hexsha, timestamp, date, author, subject, body FROM candidates CROSS JOIN commits USING (id)"
+                " ORDER BY timestamp DESC, id DESC"
+            )
+
+        found = []
+        for row in rows:
+            if candidates is not None and row[0] not in candidates:
+                continue
+            commit = CommitRecord(*row[1:])
+            if pattern.search(commit.message) if regex else query_lower in commit.message_lower:
+                found.append(commit)
+                if len(found) >= num_commits:
+                    break
+        return found
+
+    def close(self):
+        self.db.close()
+
+def open_commit_index():
+    """Open and update the commit index of the current repository, or return None if it cannot be used."""
+    db_path = os.path.join(get_git_dir(), "gitfind", "index.sqlite")
+    try:
+        index = CommitIndex(db_path)
+        index.update()
+        return index
+    except sqlite3.Error as e:
+        logger.warning(f"Could not use commit index {db_path}: {e}. Scanning commits instead.")
+        return None
@@ -3,6 +3,9 @@ import os
 import re
 import sys
 import logging
+from collections import OrderedDict, deque
+from contextlib import closing
+from itertools import islice
 from tqdm import tqdm
 
 try:
@@ -28,6 +31,13 @@ def get_git_repo():
         logger.error("Error: Not a valid Git repository.")
         sys.exit(1)
 
+def get_git_dir():
+    stdout, _ = run_command("git rev-parse --absolute-git-dir")
+    if not stdout:
+        logger.error("Error: Not a valid Git repository.")
+        sys.exit(1)
+    return stdout
+
 def get_git_stats():
     logger.debug("Getting Git stats.")
     if GITPYTHON_AVAILABLE:
@@ -41,14 +51,86 @@ def get_git_stats():
         remote_urls, _ = run_command("git remote -v")
     return repo_name, current_branch, remote_urls
 
+class CommitRecord:
+    """One commit as loaded by load_commits(), with its lowercased message precomputed for searching."""
+    __slots__ = ("hexsha", "timestamp", "date", "author", "subject", "message", "message_lower")
+
+    def __init__(self, hexsha, timestamp, date, author, subject, body):
+        self.hexsha = hexsha
+        self.timestamp = int(timestamp)
+        self.date = date
+        self.author = author
+        self.subject = subject
+        self.message = f"{subject}\n\n{body}" if body else subject
+        self.message_lower = self.message.lower()
+
+# Fields of one commit in the NUL-delimited 'git log -z' stream read by load_commits().
+COMMIT_FIELDS = "%H%x00%ct%x00%ad%x00%an%x00%s%x00%b"
+COMMIT_FIELD_COUNT = 6
+
+def iter_commits(log_args=("--all",), chunk_size=1 << 16, stdin_revs=None, paths=()):
+    """
+    Stream CommitRecords, newest first, from a single 'git log -z <log_args> -- <paths>' call.
+    Extra revisions (e.g. '^<sha>' exclusions) can be fed through stdin_revs without hitting
+    command line length limits. Closing the generator early terminates git, so callers that
+    only need the first few commits never read the rest of the history.
+    Raises subprocess.CalledProcessError after the last commit if git log failed.
+    """
+    command = ["git", "log", *log_args, "-z", "--date=short", f"--pretty=format:{COMMIT_FIELDS}"]
+    if stdin_revs is not None:
+        command.append("--stdin")
+    if paths:
+        command += ["--", *paths]
+    fields = []
+    pending = ""
+    proc = subprocess.Popen(command, stdin=subprocess.PIPE if stdin_revs is not None else None,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            text=True, encoding="utf-8", errors="replace")
+    try:
+        if stdin_revs is not None:
+            proc.stdin.write("".join(f"{rev}\n" for rev in stdin_revs))
+            proc.stdin.close()
+        while True:
+            chunk = proc.stdout.read(chunk_size)
+            if not chunk:
+                break
+            # Commits are separated by NUL as well, so the stream is a flat sequence of fields.
+            parts = (pending + chunk).split("\0")
+            pending = parts.pop()
+            for part in parts:
+                fields.append(part)
+                if len(fields) == COMMIT_FIELD_COUNT:
+                    yield CommitRecord(*fields)
+                    fields = []
+        fields.append(pending)
+        if len(fields) == COMMIT_FIELD_COUNT:
+            yield CommitRecord(*fields)
+    finally:
+        if proc.poll() is None:
+            proc.kill()  # Stopped early; the rest of the history is not needed.
+        proc.stdout.close()
+        proc.wait()
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, command)
+
+def load_commits(rev_args=("--all",), chunk_size=1 << 16, stdin_revs=None):
+    """
+    Load every commit with a single streamed 'git log -z' call, so searching and displaying
+    commits never spawns git per commit. Returns a list of CommitRecord, newest first,
+    or None if git log fails.
+    """
+    logger.debug("Loading all commits in a single pass.")
+    try:
+        return list(iter_commits(rev_args, chunk_size, stdin_revs))
+    except subprocess.CalledProcessError:
+        return None
+
 def fetch_all_commits(repo=None):
     logger.debug("Fetching all commits.")
     if GITPYTHON_AVAILABLE and repo:
         commits = list(repo.iter_commits('--all'))
     else:
-        commits_output, _ = run_command("git log --all --pretty=format:'%H'")
-        commit_hashes = commits_output.split()
-        commits = [commit_hash.strip() for commit_hash in commit_hashes]
+        commits = load_commits() or []
     return commits
 
 def filter_commits(commits, search_keyword, num_commits, regex, repo=None):
@@ -69,14 +151,14 @@ def filter_commits(commits, search_keyword, num_commits, regex, repo=None):
                     break
                 progress_bar.update(1)
         else:
-            for commit_hash in commits:
-                commit_message, _ = run_command(f"git log -1 --pretty=%B {commit_hash}")
+            keyword_lower = search_keyword.lower()
+            for commit in commits:
                 if regex:
-                    if re.search(search_keyword, commit_message):
-                        filtered_commits.append(commit_hash)
+                    if re.search(search_keyword, commit.message):
+                        filtered_commits.append(commit)
                 else:
-                    if search_keyword.lower() in commit_message.lower():
-                        filtered_commits.append(commit_hash)
+                    if keyword_lower in commit.message_lower:
+                        filtered_commits.append(commit)
                 if len(filtered_commits) >= num_commits:
                     break
                 progress_bar.update(1)
@@ -85,12 +167,68 @@ def filter_commits(commits, search_keyword, num_commits, regex, repo=None):
     return filtered_commits
 
 def get_commit_info(commit, repo=None):
-    if GITPYTHON_AVAILABLE and repo:
+    if isinstance(commit, CommitRecord):
+        return f"{commit.hexsha[:7]} {commit.date} | {commit.subject} [{commit.author}]"
+    elif GITPYTHON_AVAILABLE and repo:
         return f"{commit.hexsha[:7]} {commit.committed_datetime.date()} | {commit.summary} [{commit.author}]"
     else:
         commit_info, _ = run_command(f"git show -s --format='%h %ad | %s [%an]' --date=short {commit}")
         return commit_info
 
+# Number of formatted commit lines kept by a CommitInfoCache.
+DISPLAY_CACHE_SIZE = 4096
+
+class CommitInfoCache:
+    """
+    Bounded LRU cache of get_commit_info() lines keyed by commit hash.
+    Lines of loaded commits (CommitRecord or GitPython objects) are formatted from the data at hand;
+    bare hashes that miss the cache are formatted together by a single 'git log --no-walk' call.
+    """
+
+    def __init__(self, max_entries=DISPLAY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lines = OrderedDict()
+
+    def lines(self, commits, repo=None):
+        """Return the display line of every commit in *commits*, in order."""
+        keys = [commit if isinstance(commit, str) else commit.hexsha for commit in commits]
+        bare = [commit for commit in commits if isinstance(commit, str) and commit not in self._lines]
+        if bare:
+            self._fill(bare)
+        result = []
+        for commit, key in zip(commits, keys):
+            line = self._lines.get(key)
+            if line is None and isinstance(commit, str):
+                line = commit  # Unknown to git; shown as is.
+            elif line is None:
+                line = self._lines[key] = get_commit_info(commit, repo)
+            else:
+                self._lines.move_to_end(key)
+            result.append(line)
+        while len(self._lines) > self.max_entries:
+            self._lines.popitem(last=False)
+        return result
+
+    def _fill(self, hashes):
+        logger.debug(f"Formatting {len(hashes)} commits in one call.")
+        # Resolve (possibly abbreviated) hashes first, so one unknown hash cannot fail the whole batch.
+        checked = subprocess.run(["git", "cat-file", "--batch-check=%(objectname) %(objecttype)"],
+                                 input="\n".join(hashes) + "\n", stdout=subprocess.PIPE, text=True).stdout.splitlines()
+        full = {}
+        for commit_hash, line in zip(hashes, checked):
+            parts = line.split()
+            if len(parts) == 2 and parts[1] == "commit":
+                full[parts[0]] = commit_hash
+        if not full:
+            return
+        result = subprocess.run(["git", "log", "--no-walk=unsorted", "--date=short", "-z", "--stdin",
+                                 "--format=%H%x00%h %ad | %s [%an]"], input="\n".join(full) + "\n",
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, errors="replace")
+        fields = result.stdout.split("\0")
+        for full_hash, line in zip(fields[0::2], fields[1::2]):
+            if full_hash in full:
+                self._lines[full[full_hash]] = line
+
 def search_branches(branch_name):
     logger.debug(f"Searching for branch: {branch_name}")
     if GITPYTHON_AVAILABLE:
@@ -108,4 +246,45 @@ def search_branches(branch_name):
         else:
             print(f"No branches found with the name: {branch_name}")
 
-# Add other functions that you need, e.g., file_commits, substring_commits, etc.
+def take_commits(commits, num_commits, sort_order="chronological", sort_direction="desc"):
+    """
+    Select num_commits commits from a newest-first stream and return them in display order.
+    Newest first is the default; reverse-chronological order or ascending direction flips it
+    (both together cancel out). Newest first stops reading the stream after num_commits commits;
+    oldest first has to read it to the end but only keeps the last num_commits of them.
+    """
+    newest_first = (sort_direction == "desc") != (sort_order == "reverse-chronological")
+    if newest_first:
+        return list(islice(commits, num_commits))
+    selected = list(deque(commits, maxlen=num_commits))
+    selected.reverse()
+    return selected
+
+def file_commits(repo, file_path, num_commits, sort_order="chronological", sort_direction="desc"):
+    """
+    Commits that touched *file_path*, following it across renames ('git log --follow').
+    git stops as soon as enough commits are collected (see take_commits()).
+    """
+    logger.debug(f"Finding commits for file: {file_path}")
+    with closing(iter_commits(("--follow",), paths=(file_path,))) as commits:
+        try:
+            return take_commits(commits, num_commits, sort_order, sort_direction)
+        except subprocess.CalledProcessError:
+            logger.error(f"Error: Could not read the history of {file_path}.")
+            return []
+
+def substring_commits(repo, substring, num_commits, sort_order="chronological", sort_direction="desc"):
+    """
+    Commits on any ref whose hash or one-line summary ('<hash> <date> | <subject> [<author>]')
+    contains *substring*, like 'git log --all --oneline | grep'. git stops as soon as enough
+    commits are collected (see take_commits()).
+    """
+    logger.debug(f"Finding commits containing: {substring}")
+    with closing(iter_commits(("--all",))) as commits:
+        matches = (commit for commit in commits
+                   if substring in commit.hexsha or substring in get_commit_info(commit))
+        try:
+            return take_commits(matches, num_commits, sort_order, sort_direction)
+        except subprocess.CalledProcessError:
+            logger.error("Error: Could not read the commit history.")
+            return []
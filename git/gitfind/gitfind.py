@@ -12,8 +12,10 @@ from tqdm import tqdm
 script_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, script_dir)
 
-from git_operations import get_git_repo, search_branches, file_commits, substring_commits, fetch_all_commits, filter_commits, get_commit_info, GITPYTHON_AVAILABLE
+from git_operations import get_git_repo, search_branches, file_commits, substring_commits, fetch_all_commits, filter_commits, CommitInfoCache, GITPYTHON_AVAILABLE
 from visualization import interactive_mode
+from commit_index import open_commit_index
+from query_planner import CommitQuery, run_query
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -21,17 +23,28 @@ logger = logging.getLogger(__name__)
 def main():
     logger.debug("Starting main function.")
     parser = argparse.ArgumentParser(description="GitFind - A tool for searching Git commits.")
-    parser.add_argument("command", choices=["branch-search", "search-commits", "file-commits", "substring-commits"], nargs="?", help="Command to run")
+    parser.add_argument("command", choices=["branch-search", "search-commits", "file-commits", "substring-commits", "serve"], nargs="?", help="Command to run")
     parser.add_argument("argument", nargs="?", help="Argument for the command")
     parser.add_argument("-m", "--min-char-length", type=int, default=0, help="Minimum character length to start searching (default: 0)")
     parser.add_argument("-n", "--num-commits", type=int, default=10, help="Number of commits to display (default: 10)")
     parser.add_argument("-o", "--sort-order", choices=["chronological", "reverse-chronological"], default="chronological", help="Sort order for commits (default: chronological)")
     parser.add_argument("-d", "--sort-direction", choices=["asc", "desc"], default="desc", help="Sort direction for commits (default: desc)")
     parser.add_argument("-r", "--regex", action="store_true", help="Enable regular expression search")
+    parser.add_argument("--author", help="search-commits: only commits whose author name or email contains this text")
+    parser.add_argument("--since", help="search-commits: only commits committed after this date (any 'git log --since' format)")
+    parser.add_argument("--until", help="search-commits: only commits committed before this date")
+    parser.add_argument("--path", action="append", default=[], help="search-commits: only commits touching this path (repeatable)")
+    parser.add_argument("-S", "--pickaxe", help="search-commits: only commits changing the number of occurrences of this string")
+    parser.add_argument("-G", "--diff-regex", help="search-commits: only commits adding or removing a line matching this regex")
+    parser.add_argument("--no-index", action="store_true", help="Scan all commits instead of using the commit index stored in .git/gitfind/")
 
-    args = parser.parse_args()
+    args = parser.parse_intermixed_args()
 
-    if args.command:
+    if args.command == "serve":
+        # Imported here so the other commands do not pay for the server modules.
+        from gitfind_server import serve
+        serve(not args.no_index)
+    elif args.command:
         repo = get_git_repo() if GITPYTHON_AVAILABLE else None
         if args.command == "branch-search":
             if args.argument:
@@ -40,34 +53,49 @@ def main():
                 print("Error: branch-search requires a branch name argument.")
                 sys.exit(1)
         elif args.command == "search-commits":
-            if args.argument:
-                all_commits = fetch_all_commits(repo)
-                with tqdm(total=args.num_commits, desc="Filtering commits") as progress_bar:
-                    filtered_commits = filter_commits(all_commits, args.argument, args.num_commits, args.regex, repo)
-                for commit in filtered_commits:
-                    print(get_commit_info(commit, repo))
+            query = CommitQuery(args.argument, args.regex, args.author, args.since, args.until, args.path, args.pickaxe, args.diff_regex)
+            if query.has_predicates():
+                # Pushed down into one 'git log' call; the commit index only covers message text.
+                try:
+                    commits = run_query(query, args.num_commits, args.sort_order, args.sort_direction)
+                except ValueError as e:
+                    print(f"Error: {e}")
+                    sys.exit(1)
+                for line in CommitInfoCache().lines(commits, repo):
+                    print(line)
+            elif args.argument:
+                index = None if args.no_index else open_commit_index()
+                if index:
+                    filtered_commits = index.search(args.argument, args.num_commits, args.regex)
+                    index.close()
+                else:
+                    all_commits = fetch_all_commits(repo)
+                    with tqdm(total=args.num_commits, desc="Filtering commits") as progress_bar:
+                        filtered_commits = filter_commits(all_commits, args.argument, args.num_commits, args.regex, repo)
+                for line in CommitInfoCache().lines(filtered_commits, repo):
+                    print(line)
             else:
                 print("Error: search-commits requires a search keyword argument.")
                 sys.exit(1)
         elif args.command == "file-commits":
             if args.argument:
                 commits = file_commits(repo, args.argument, args.num_commits, args.sort_order, args.sort_direction)
-                for commit in commits:
-                    print(get_commit_info(commit, repo))
+                for line in CommitInfoCache().lines(commits, repo):
+                    print(line)
             else:
                 print("Error: file-commits requires a file path argument.")
                 sys.exit(1)
         elif args.command == "substring-commits":
             if args.argument:
                 commits = substring_commits(repo, args.argument, args.num_commits, args.sort_order, args.sort_direction)
-                for commit in commits:
-                    print(get_commit_info(commit, repo))
+                for line in CommitInfoCache().lines(commits, repo):
+                    print(line)
             else:
                 print("Error: substring-commits requires a substring argument.")
                 sys.exit(1)
     else:
         print("Entering interactive mode. Press Ctrl+C to exit.")
-        wrapper(interactive_mode, args.min_char_length, args.num_commits, args.sort_order, args.sort_direction, args.regex)
+        wrapper(interactive_mode, args.min_char_length, args.num_commits, args.sort_order, args.sort_direction, args.regex, not args.no_index)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+=============================================================
+ GitFind Latency Benchmark
+=============================================================
+
+ Author:  JessyJP
+
+ Description:
+   Measures the latency of the gitfind search backends on a
+   synthetic Git repository with a large history spread over
+   many branches. The repository is generated with
+   `git fast-import` from a fixed seed, so the same parameters
+   always produce the same history. Every backend runs in its
+   own Python process so peak memory is measured in isolation.
+
+ Backends:
+   - cli:       commits loaded by one streamed `git log` call.
+   - gitpython: commits loaded through GitPython (if installed).
+   - index:     the persistent trigram index in .git/gitfind/.
+
+ Measurements (per backend):
+   - Cold start: importing gitfind, loading the commits (or
+     opening the index) and answering the first query.
+   - Full load time (for the index: first build and reopen).
+   - Substring and regex query latency percentiles.
+   - Per-keystroke latency of the interactive search worker.
+   - Peak RSS of the Python process and of its git children.
+
+ Usage:
+   # 100k commits on 50 branches, all backends
+   ./gitfind_benchmark.py --commits 100000 --branches 50
+
+   # Save the measurements for comparison with a later run
+   ./gitfind_benchmark.py --commits 500000 --backends cli index --json bench.json
+
+=============================================================
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+BACKENDS = ["cli", "gitpython", "index"]
+WORDS = ["fix", "add", "update", "refactor", "cache", "index", "parser", "render", "network", "memory",
+         "docs", "test", "api", "ui", "speed", "leak", "build", "config", "release", "cleanup",
+         "deadlock", "overflow", "unicode", "timeout", "regression"]
+# Substring queries, from very common to absent.
+SUBSTRING_QUERIES = ["fix", "render leak", "deadlock overflow", "zzzqqq"]
+# Regular expression queries; the last one matches nothing.
+REGEX_QUERIES = [r"fix(es|ed)? cache", r"#1\d{3}\b", r"^Revert "]
+# Typed one character at a time for the per-keystroke measurement.
+TYPED_QUERY = "memory leak"
+
+
+# ----------------------------------
+# SYNTHETIC REPOSITORY
+# ----------------------------------
+# This section generates a reproducible history with a configurable shape.
+
+def generate_repo(path, commits, branches, authors, files, seed=1):
+    """
+    Create a Git repository at *path* through one 'git fast-import' stream:
+      - *commits* commits, each by a random one of *authors* authors, with a message of
+        random words (a few are far more frequent than the rest) and a '#<number>' tag,
+        and a change to one of *files* small files.
+      - Half of the commits go to main, the others to one of *branches* branches, each
+        forked from main where its first commit lands.
+    An existing repository generated with the same parameters is reused.
+    """
+    params = {"commits": commits, "branches": branches, "authors": authors, "files": files, "seed": seed}
+    params_path = os.path.join(path, ".git", "benchmark-params.json")
+    try:
+        with open(params_path, encoding="utf-8") as fh:
+            if json.load(fh) == params:
+                return
+    except (OSError, ValueError):
+        pass
+
+    if os.path.exists(path) and os.listdir(path):
+        print(f"Error: {path} exists and was not generated with these parameters.")
+        sys.exit(1)
+    os.makedirs(path, exist_ok=True)
+    subprocess.check_call(["git", "init", "-q", "-b", "main", path])
+
+    rng = random.Random(seed)
+    names = [f"Author {i} <author{i}@example.com>" for i in range(authors)]
+    weights = [1 / (rank + 1) for rank in range(len(WORDS))]  # Zipf-like word frequencies.
+    refs = ["refs/heads/main"] + [f"refs/heads/feature/{i}" for i in range(branches)]
+    tips = {}
+
+    proc = subprocess.Popen(["git", "fast-import", "--quiet"], cwd=path, stdin=subprocess.PIPE)
+    timestamp = 1_400_000_000
+    for number in range(1, commits + 1):
+        ref = refs[0] if number == 1 or not branches or rng.random() < 0.5 else rng.choice(refs[1:])
+        parent = tips.get(ref, tips.get(refs[0]))
+        author = rng.choice(names)
+        timestamp += rng.randint(60, 3600)
+        message = " ".join(rng.choices(WORDS, weights, k=rng.randint(2, 6))) + f" #{number}"
+        if rng.random() < 0.2:
+            message += "\n\n" + " ".join(rng.choices(WORDS, weights, k=rng.randint(5, 20)))
+        payload = message.encode("utf-8")
+        content = f"{number}\n".encode("ascii")
+        proc.stdin.write(f"commit {ref}\nmark :{number}\n"
+                         f"author {author} {timestamp} +0000\ncommitter {author} {timestamp} +0000\n".encode("utf-8"))
+        proc.stdin.write(b"data %d\n" % len(payload) + payload + b"\n")
+        if parent:
+            proc.stdin.write(f"from :{parent}\n".encode("ascii"))
+        proc.stdin.write(f"M 100644 inline src/file{rng.randrange(files)}.txt\n".encode("ascii"))
+        proc.stdin.write(b"data %d\n" % len(content) + content + b"\n")
+        tips[ref] = number
+    proc.stdin.close()
+    if proc.wait() != 0:
+        print("Error: git fast-import failed.")
+        sys.exit(1)
+
+    subprocess.check_call(["git", "reset", "-q", "--hard", "main"], cwd=path)
+    with open(params_path, "w", encoding="utf-8") as fh:
+        json.dump(params, fh)
+
+
+# ----------------------------------
+# MEASUREMENT
+# ----------------------------------
+# This section runs one backend against the repository and reports its measurements.
+
+def percentile(sorted_values, fraction):
+    """Return the value at *fraction* (0-1) of an ascending list, or 0.0 if it is empty."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def summarize(seconds):
+    """Percentiles of a list of durations, in milliseconds."""
+    values = sorted(seconds)
+    return {
+        "p50": round(percentile(values, 0.50) * 1000, 3),
+        "p90": round(percentile(values, 0.90) * 1000, 3),
+        "p99": round(percentile(values, 0.99) * 1000, 3),
+        "max": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+def peak_rss_mb(who):
+    """Peak resident set size in MB for RUSAGE_SELF or RUSAGE_CHILDREN, or None if unavailable."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def measure_keystrokes(worker, text):
+    """Request every prefix of *text* in turn and return the seconds until each complete result."""
+    latencies = []
+    for end in range(len(text) + 1):
+        term = text[:end]
+        start = time.perf_counter()
+        worker.request(term)
+        while True:
+            results = worker.poll()
+            if results and results[0] == term and results[2]:
+                break
+            time.sleep(0.0005)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run_backend(repo_path, backend, num_commits, repeat):
+    """
+    Measure one backend inside the current process and return the measurements as a dict.
+    gitfind is imported here, so its import time is part of the cold start.
+    """
+    os.chdir(repo_path)
+    logging.disable(logging.CRITICAL)  # Debug logging is not part of what is measured.
+    start = time.perf_counter()
+    sys.path.insert(0, script_dir)
+    import git_operations
+    if backend == "gitpython" and not git_operations.GITPYTHON_AVAILABLE:
+        return {"backend": backend, "skipped": "GitPython is not installed"}
+    from commit_index import open_commit_index
+    from visualization import SearchWorker
+    import_seconds = time.perf_counter() - start
+
+    result = {"backend": backend, "import_ms": round(import_seconds * 1000, 3)}
+    repo = git_operations.get_git_repo() if backend == "gitpython" else None
+    if backend == "index":
+        db_path = os.path.join(git_operations.get_git_dir(), "gitfind", "index.sqlite")
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        load_start = time.perf_counter()
+        index = open_commit_index()
+        result["index_build_ms"] = round((time.perf_counter() - load_start) * 1000, 3)
+        index.close()
+        load_start = time.perf_counter()
+        index = open_commit_index()
+
+        def search(term, regex):
+            return index.search(term, num_commits, regex)
+    else:
+        load_start = time.perf_counter()
+        commits = git_operations.fetch_all_commits(repo)
+        result["commits"] = len(commits)
+
+        def search(term, regex):
+            return git_operations.filter_commits(commits, term, num_commits, regex, repo)
+    result["full_load_ms"] = round((time.perf_counter() - load_start) * 1000, 3)
+    search(SUBSTRING_QUERIES[0], False)
+    result["cold_start_ms"] = round((time.perf_counter() - start) * 1000, 3)
+
+    for kind, queries, regex in (("substring", SUBSTRING_QUERIES, False), ("regex", REGEX_QUERIES, True)):
+        per_query = {}
+        for query in queries:
+            latencies = []
+            for _ in range(repeat):
+                query_start = time.perf_counter()
+                search(query, regex)
+                latencies.append(time.perf_counter() - query_start)
+            per_query[query] = summarize(latencies)
+        result[f"{kind}_ms"] = per_query
+    if backend == "index":
+        index.close()
+
+    worker = SearchWorker(repo, num_commits, False, use_index=backend == "index")
+    measure_keystrokes(worker, "")  # Wait until the worker has loaded its commits.
+    keystrokes = []
+    for _ in range(repeat):
+        keystrokes += measure_keystrokes(worker, TYPED_QUERY)[1:]
+    result["keystroke_ms"] = summarize(keystrokes)
+    result["peak_rss_mb"] = peak_rss_mb(resource.RUSAGE_SELF) if resource else None
+    result["peak_child_rss_mb"] = peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None
+    return result
+
+
+def run_isolated(repo_path, backend, num_commits, repeat):
+    """Run one backend in a fresh Python process and return its measurements."""
+    cmd = [sys.executable, os.path.abspath(__file__), "--run-one", repo_path, "--backend", backend,
+           "--num-commits", str(num_commits), "--repeat", str(repeat)]
+    # Progress bars of the backends go to stderr and are not shown.
+    output = subprocess.check_output(cmd, text=True, stderr=subprocess.DEVNULL)
+    return json.loads(output.splitlines()[-1])
+
+
+def git_version():
+    return subprocess.check_output(["git", "--version"], text=True).strip()
+
+
+# ----------------------------------
+# MAIN
+# ----------------------------------
+# This section handles command-line argument parsing and the main execution flow.
+
+def parse_args():
+    """
+    Parse command-line arguments.
+    - --repo: Where the synthetic repository is generated (or reused).
+    - --commits / --branches / --authors / --files / --seed: Shape of the repository.
+    - --backends: Backends to measure (cli, gitpython, index).
+    - --num-commits: Results requested per query, as gitfind's -n.
+    - --repeat: Runs of every query and of the typed query.
+    - --json: Save all measurements to this file.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the gitfind search backends on a synthetic repository.")
+    parser.add_argument("--repo", default=os.path.join(os.getcwd(), "gitfind-bench-repo"),
+                        help="Directory of the synthetic repository (default: ./gitfind-bench-repo).")
+    parser.add_argument("--commits", type=int, default=10000, help="Number of commits (default: 10000).")
+    parser.add_argument("--branches", type=int, default=20, help="Number of branches besides main (default: 20).")
+    parser.add_argument("--authors", type=int, default=50, help="Number of distinct authors (default: 50).")
+    parser.add_argument("--files", type=int, default=200, help="Number of files changed by the commits (default: 200).")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed of the generator (default: 1).")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS,
+                        help="Backends to measure (default: all).")
+    parser.add_argument("--num-commits", type=int, default=10, help="Results requested per query (default: 10).")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs of every query (default: 5).")
+    parser.add_argument("--json", metavar="FILE", default=None, help="Save the measurements as JSON to FILE.")
+    parser.add_argument("--run-one", metavar="REPO", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--backend", choices=BACKENDS, default=None, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    # Child process: measure a single backend and print it as JSON.
+    if args.run_one:
+        print(json.dumps(run_backend(args.run_one, args.backend, args.num_commits, args.repeat)))
+        return
+
+    repo = os.path.abspath(args.repo)
+    print(f"Preparing synthetic repository in {repo} ...")
+    start = time.perf_counter()
+    generate_repo(repo, args.commits, args.branches, args.authors, args.files, args.seed)
+    print(f"Repository ready in {time.perf_counter() - start:.1f}s.\n")
+
+    results = []
+    print(f"{'Backend':<10} {'Cold ms':>9} {'Load ms':>9} {'Substr p50':>11} {'Regex p50':>10} "
+          f"{'Key p50':>8} {'Key p99':>8} {'RSS MB':>8}")
+    print("-" * 80)
+    for backend in args.backends:
+        result = run_isolated(repo, backend, args.num_commits, args.repeat)
+        results.append(result)
+        if "skipped" in result:
+            print(f"{backend:<10} skipped: {result['skipped']}")
+            continue
+        substring = max(latency["p50"] for latency in result["substring_ms"].values())
+        regex = max(latency["p50"] for latency in result["regex_ms"].values())
+        rss = f"{result['peak_rss_mb']:.1f}" if result["peak_rss_mb"] is not None else "n/a"
+        print(f"{backend:<10} {result['cold_start_ms']:>9.1f} {result['full_load_ms']:>9.1f} {substring:>11.2f} "
+              f"{regex:>10.2f} {result['keystroke_ms']['p50']:>8.2f} {result['keystroke_ms']['p99']:>8.2f} {rss:>8}")
+    print("\nQuery columns show the slowest query's median.")
+
+    if args.json:
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "machine": {
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "python": platform.python_version(),
+                "git": git_version(),
+            },
+            "repository": {"path": repo, "commits": args.commits, "branches": args.branches,
+                           "authors": args.authors, "files": args.files, "seed": args.seed},
+            "queries": {"num_commits": args.num_commits, "repeat": args.repeat, "substring": SUBSTRING_QUERIES,
+                        "regex": REGEX_QUERIES, "typed": TYPED_QUERY},
+            "results": results,
+        }
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"\nSaved results to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
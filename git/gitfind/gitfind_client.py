@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Thin client for a running 'gitfind.py serve' server of the current repository.
+Only the standard library is imported, so a query costs one socket round trip instead of
+loading GitPython, tqdm and the commit history. Without a running server the query is
+handed to gitfind.py unchanged.
+"""
+
+import os
+import sys
+import json
+import socket
+import hashlib
+import argparse
+import tempfile
+
+COMMANDS = ["branch-search", "search-commits", "file-commits", "substring-commits"]
+# Seconds the client waits for the server to answer.
+QUERY_TIMEOUT = 30.0
+# Longest socket path accepted by AF_UNIX on common platforms, minus some margin.
+MAX_SOCKET_PATH = 100
+
+def find_git_dir(start):
+    """Return the real path of the .git directory of the repository containing *start*, or None."""
+    path = os.path.realpath(start)
+    while True:
+        dot_git = os.path.join(path, ".git")
+        if os.path.isdir(dot_git):
+            return dot_git
+        if os.path.isfile(dot_git):
+            # Worktrees and submodules: ".git" is a file containing "gitdir: <path>".
+            with open(dot_git, encoding="utf-8") as fh:
+                line = fh.readline().strip()
+            if line.startswith("gitdir:"):
+                return os.path.realpath(os.path.join(path, line[len("gitdir:"):].strip()))
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+def get_socket_path(git_dir):
+    """Socket of the server of the repository at *git_dir*; in the temp directory if the path would be too long."""
+    path = os.path.join(git_dir, "gitfind", "server.sock")
+    if len(path) <= MAX_SOCKET_PATH:
+        return path
+    digest = hashlib.sha1(git_dir.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"gitfind-{os.getuid()}-{digest}.sock")
+
+def query(socket_path, request, timeout=QUERY_TIMEOUT):
+    """Send one JSON request line and return the decoded JSON response. Raises OSError if no server answers."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        chunks = []
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    return json.loads(b"".join(chunks).decode("utf-8"))
+
+def run_gitfind():
+    """Hand the command line to the full gitfind.py."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gitfind.py")
+    os.execv(sys.executable, [sys.executable, script, *sys.argv[1:]])
+
+def main():
+    parser = argparse.ArgumentParser(description="GitFind client - answers queries through a running 'gitfind.py serve'.")
+    parser.add_argument("command", choices=COMMANDS + ["stop-server"], help="Command to run")
+    parser.add_argument("argument", nargs="?", help="Argument for the command")
+    parser.add_argument("-n", "--num-commits", type=int, default=10, help="Number of commits to display (default: 10)")
+    parser.add_argument("-o", "--sort-order", choices=["chronological", "reverse-chronological"], default="chronological", help="Sort order for commits (default: chronological)")
+    parser.add_argument("-d", "--sort-direction", choices=["asc", "desc"], default="desc", help="Sort direction for commits (default: desc)")
+    parser.add_argument("-r", "--regex", action="store_true", help="Enable regular expression search")
+    parser.add_argument("--author", help="search-commits: only commits whose author name or email contains this text")
+    parser.add_argument("--since", help="search-commits: only commits committed after this date (any 'git log --since' format)")
+    parser.add_argument("--until", help="search-commits: only commits committed before this date")
+    parser.add_argument("--path", action="append", default=[], help="search-commits: only commits touching this path (repeatable)")
+    parser.add_argument("-S", "--pickaxe", help="search-commits: only commits changing the number of occurrences of this string")
+    parser.add_argument("-G", "--diff-regex", help="search-commits: only commits adding or removing a line matching this regex")
+    args = parser.parse_intermixed_args()
+
+    git_dir = find_git_dir(os.getcwd())
+    if git_dir is None:
+        print("Error: Not a valid Git repository.", file=sys.stderr)
+        sys.exit(1)
+    filters = {"author": args.author, "since": args.since, "until": args.until,
+               "paths": [os.path.abspath(path) for path in args.path], "pickaxe": args.pickaxe, "diff_regex": args.diff_regex}
+    has_filters = args.command == "search-commits" and any(filters.values())
+    if args.command != "stop-server" and not args.argument and not has_filters:
+        print(f"Error: {args.command} requires an argument.", file=sys.stderr)
+        sys.exit(1)
+
+    argument = args.argument
+    if args.command == "file-commits":
+        argument = os.path.abspath(argument)  # The server runs in the repository root.
+    request = {
+        "command": args.command,
+        "argument": argument,
+        "num_commits": args.num_commits,
+        "sort_order": args.sort_order,
+        "sort_direction": args.sort_direction,
+        "regex": args.regex,
+        **filters,
+    }
+    try:
+        response = query(get_socket_path(git_dir), request)
+    except (OSError, ValueError):
+        if args.command == "stop-server":
+            print("No gitfind server is running for this repository.")
+            return
+        run_gitfind()
+
+    if "error" in response:
+        print(f"Error: {response['error']}", file=sys.stderr)
+        sys.exit(1)
+    for line in response["lines"]:
+        print(line)
+
+if __name__ == "__main__":
+    main()
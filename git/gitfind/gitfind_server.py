@@ -0,0 +1,155 @@
+import os
+import re
+import sys
+import json
+import socket
+import logging
+import socketserver
+
+from git_operations import CommitInfoCache, file_commits, substring_commits, fetch_all_commits, filter_commits, run_command
+from commit_index import open_commit_index
+from query_planner import CommitQuery, run_query
+from gitfind_client import find_git_dir, get_socket_path
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for changed refs while no request arrives.
+REFRESH_INTERVAL = 2.0
+
+def get_refs_signature(common_dir):
+    """Modification times of HEAD, packed-refs and every loose ref; changes whenever a ref moves."""
+    signature = []
+    for name in ("HEAD", "packed-refs"):
+        try:
+            signature.append((name, os.stat(os.path.join(common_dir, name)).st_mtime_ns))
+        except OSError:
+            pass
+    for dirpath, _, filenames in os.walk(os.path.join(common_dir, "refs")):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            try:
+                signature.append((path, os.stat(path).st_mtime_ns))
+            except OSError:
+                pass  # Removed while walking.
+    return sorted(signature)
+
+class GitFindHandler(socketserver.StreamRequestHandler):
+    """Answers one JSON request line with one JSON response."""
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            response = {"lines": self.server.answer(request)}
+        except (ValueError, KeyError) as e:
+            response = {"error": str(e)}
+        self.wfile.write(json.dumps(response).encode("utf-8"))
+
+class GitFindServer(socketserver.UnixStreamServer):
+    """
+    Resident gitfind for one repository. The commit index, the formatted commit lines and the branch
+    list stay loaded between requests and are refreshed incrementally whenever a ref moves.
+    Requests are answered one at a time, so the SQLite connection is only used by one thread.
+    """
+
+    timeout = REFRESH_INTERVAL
+
+    def __init__(self, socket_path, use_index=True):
+        super().__init__(socket_path, GitFindHandler)
+        self.common_dir, _ = run_command("git rev-parse --path-format=absolute --git-common-dir")
+        self.index = open_commit_index() if use_index else None
+        self.all_commits = None  # Only loaded when the index cannot be used.
+        self.info_cache = CommitInfoCache()
+        self.branches = []
+        self.signature = None
+        self.running = True
+        self.refresh()
+
+    def refresh(self):
+        signature = get_refs_signature(self.common_dir)
+        if signature == self.signature:
+            return
+        logger.debug("Refs changed, refreshing.")
+        self.signature = signature
+        if self.index:
+            self.index.update()
+        else:
+            self.all_commits = fetch_all_commits()
+        output, _ = run_command("git for-each-ref --format='%(refname:short)' refs/heads refs/remotes")
+        self.branches = output.splitlines()
+
+    def handle_timeout(self):
+        self.refresh()
+
+    def answer(self, request):
+        """Return the output lines of *request*, as gitfind.py would print them."""
+        self.refresh()
+        command = request["command"]
+        argument = request.get("argument")
+        num_commits = request.get("num_commits", 10)
+        sort_order = request.get("sort_order", "chronological")
+        sort_direction = request.get("sort_direction", "desc")
+        if command == "stop-server":
+            self.running = False
+            return ["gitfind server stopped."]
+        query = CommitQuery(argument, request.get("regex", False), request.get("author"), request.get("since"),
+                            request.get("until"), request.get("paths", ()), request.get("pickaxe"), request.get("diff_regex"))
+        if command == "search-commits" and query.has_predicates():
+            return self.info_cache.lines(run_query(query, num_commits, sort_order, sort_direction))
+        if not argument:
+            raise ValueError(f"{command} requires an argument.")
+        if command == "branch-search":
+            found = [f"Found branch: {branch}" for branch in self.branches if argument in branch]
+            return found or [f"No branches found with the name: {argument}"]
+        if command == "search-commits":
+            try:
+                if self.index:
+                    commits = self.index.search(argument, num_commits, request.get("regex", False))
+                else:
+                    commits = filter_commits(self.all_commits, argument, num_commits, request.get("regex", False))
+            except re.error as e:
+                raise ValueError(f"Invalid regular expression: {e}")
+        elif command == "file-commits":
+            commits = file_commits(None, argument, num_commits, sort_order, sort_direction)
+        elif command == "substring-commits":
+            commits = substring_commits(None, argument, num_commits, sort_order, sort_direction)
+        else:
+            raise ValueError(f"Unknown command: {command}")
+        return self.info_cache.lines(commits)
+
+def serve(use_index=True):
+    """Serve queries for the repository of the current directory until a 'stop-server' request arrives."""
+    top, _ = run_command("git rev-parse --show-toplevel")
+    git_dir = find_git_dir(top) if top else None
+    if git_dir is None:
+        logger.error("Error: Not a valid Git repository.")
+        sys.exit(1)
+    os.chdir(top)  # Clients send absolute paths; git commands run from the top level.
+    socket_path = get_socket_path(git_dir)
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    if os.path.exists(socket_path):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(socket_path)
+                logger.error(f"Error: A gitfind server is already running on {socket_path}.")
+                sys.exit(1)
+            except OSError:
+                os.unlink(socket_path)  # Left behind by a server that did not shut down.
+
+    old_umask = os.umask(0o177)  # Only the owner may connect.
+    try:
+        server = GitFindServer(socket_path, use_index)
+    finally:
+        os.umask(old_umask)
+    print(f"gitfind server listening on {socket_path}")
+    sys.stdout.flush()
+    try:
+        while server.running:
+            server.handle_request()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if server.index:
+            server.index.close()
+        os.unlink(socket_path)
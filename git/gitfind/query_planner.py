@@ -0,0 +1,105 @@
+import re
+import logging
+import subprocess
+from contextlib import closing
+
+from git_operations import iter_commits, take_commits
+from commit_index import required_literals
+
+logging.basicConfig(level=logging.DEBUG)
+logger = logging.getLogger(__name__)
+
+class CommitQuery:
+    """
+    Predicates a commit has to satisfy, all of them combined with AND:
+      - text: case-insensitive substring of the message, or a Python regular expression if regex is set.
+      - author: case-insensitive substring of the author name or email.
+      - since / until: committer date limits, in any format 'git log --since' accepts.
+      - paths: the commit touches one of these paths.
+      - pickaxe: the commit changes the number of occurrences of this string in the diff ('git log -S').
+      - diff_regex: a line matching this POSIX regular expression is added or removed ('git log -G').
+    Like the author and message text, pickaxe and diff_regex ignore case.
+    """
+
+    def __init__(self, text=None, regex=False, author=None, since=None, until=None, paths=(), pickaxe=None, diff_regex=None):
+        self.text = text
+        self.regex = regex
+        self.author = author
+        self.since = since
+        self.until = until
+        self.paths = list(paths)
+        self.pickaxe = pickaxe
+        self.diff_regex = diff_regex
+
+    def has_predicates(self):
+        """Whether anything besides the message text is constrained."""
+        return any((self.author, self.since, self.until, self.paths, self.pickaxe, self.diff_regex))
+
+class QueryPlan:
+    """The 'git log' arguments a query is pushed down to, and the checks that remain for Python."""
+
+    def __init__(self, log_args, paths, residual):
+        self.log_args = log_args
+        self.paths = paths
+        self.residual = residual  # Functions of a CommitRecord, all of which must return True.
+
+    def matches(self, commit):
+        return all(check(commit) for check in self.residual)
+
+    def __str__(self):
+        command = " ".join(["git log", *self.log_args] + (["--", *self.paths] if self.paths else []))
+        return f"{command} + {len(self.residual)} in-process checks"
+
+def plan_query(query):
+    """
+    Push every predicate git can evaluate itself into one 'git log' call, so git skips
+    non-matching commits (and never diffs them for pickaxe) before they reach Python.
+    Limiting patterns are passed as fixed strings, case-insensitively, and must all match:
+      - the message text becomes --grep; a regex contributes the literals every match must
+        contain, and the regex itself is checked in Python on the remaining commits.
+      - the text is checked in Python as well, because --grep matches line by line.
+    Raises ValueError for an invalid query.
+    """
+    if query.pickaxe and query.diff_regex:
+        raise ValueError("pickaxe (-S) and diff regex (-G) cannot be combined.")
+    log_args = ["--all", "--fixed-strings", "--regexp-ignore-case", "--all-match"]
+    residual = []
+    if query.author:
+        log_args.append(f"--author={query.author}")
+    if query.since:
+        log_args.append(f"--since={query.since}")
+    if query.until:
+        log_args.append(f"--until={query.until}")
+    if query.text:
+        if query.regex:
+            try:
+                pattern = re.compile(query.text)
+            except re.error as e:
+                raise ValueError(f"Invalid regular expression: {e}")
+            greps = required_literals(query.text)
+            residual.append(lambda commit: pattern.search(commit.message) is not None)
+        else:
+            greps = [query.text]
+            text_lower = query.text.lower()
+            residual.append(lambda commit: text_lower in commit.message_lower)
+        log_args += [f"--grep={literal}" for literal in greps if "\n" not in literal]
+    if query.pickaxe:
+        log_args.append(f"-S{query.pickaxe}")
+    if query.diff_regex:
+        log_args.append(f"-G{query.diff_regex}")
+    return QueryPlan(log_args, query.paths, residual)
+
+def run_query(query, num_commits, sort_order="chronological", sort_direction="desc"):
+    """
+    Return the commits matching *query* as CommitRecords in display order (see take_commits()).
+    Newest first, git stops as soon as num_commits matches are found.
+    Raises ValueError for an invalid query or when git rejects it.
+    """
+    plan = plan_query(query)
+    logger.debug(f"Query plan: {plan}")
+    with closing(iter_commits(plan.log_args, paths=plan.paths)) as commits:
+        matches = (commit for commit in commits if plan.matches(commit))
+        try:
+            return take_commits(matches, num_commits, sort_order, sort_direction)
+        except subprocess.CalledProcessError:
+            raise ValueError("git log rejected the query (check dates, paths and the -G pattern).")
@@ -1,14 +1,23 @@
+import re
+import time
 import curses
 import logging
-from tqdm import tqdm
-from .git_operations import get_git_stats, fetch_all_commits, filter_commits, get_commit_info, get_git_repo, GITPYTHON_AVAILABLE
+import threading
+from git_operations import get_git_stats, fetch_all_commits, get_git_repo, CommitRecord, CommitInfoCache, GITPYTHON_AVAILABLE
+from commit_index import open_commit_index
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-def print_git_stats(stdscr, min_char_length, num_commits, sort_order, sort_direction, regex):
-    logger.debug("Printing Git stats.")
-    repo_name, current_branch, remote_urls = get_git_stats()
+# Seconds without a keypress before a search starts.
+DEBOUNCE_INTERVAL = 0.15
+# Milliseconds getch() waits for a key before the screen is checked for new results.
+POLL_INTERVAL_MS = 50
+# Number of commits checked between checks for a newer search term.
+CANCEL_CHECK_INTERVAL = 512
+
+def print_git_stats(stdscr, min_char_length, num_commits, sort_order, sort_direction, regex, git_stats=None):
+    repo_name, current_branch, remote_urls = git_stats or get_git_stats()
     stdscr.addstr(0, 0, f"Repository: {repo_name}")
     stdscr.addstr(1, 0, f"Current Branch: {current_branch}")
     stdscr.addstr(2, 0, "Remote URLs:")
@@ -21,40 +30,168 @@ def print_git_stats(stdscr, min_char_length, num_commits, sort_order, sort_direc
     stdscr.addstr(9 + i, 0, f"Regex Mode: {regex}")
     stdscr.addstr(11 + i, 0, "Enter search term: ")
 
-def display_commits(stdscr, commits, repo=None):
-    logger.debug("Displaying commits.")
+def display_commits(stdscr, commits, repo=None, info_cache=None):
     max_y, max_x = stdscr.getmaxyx()
-    for i, commit in enumerate(commits[:max_y - 13]):  # leave space for stats and search bar
-        commit_info = get_commit_info(commit, repo)
+    visible = commits[:max(max_y - 13, 0)]  # leave space for stats and search bar
+    for i, commit_info in enumerate((info_cache or CommitInfoCache()).lines(visible, repo)):
         stdscr.addstr(13 + i, 0, commit_info[:max_x - 1])  # truncate to fit screen width
 
-def interactive_mode(stdscr, min_char_length, num_commits, sort_order, sort_direction, regex):
+def make_matcher(term, regex):
+    """Return a function telling whether a commit's message matches *term* (case-insensitive unless regex)."""
+    if regex:
+        pattern = re.compile(term)
+        return lambda commit: pattern.search(commit.message) is not None
+    term_lower = term.lower()
+    return lambda commit: term_lower in (commit.message_lower if isinstance(commit, CommitRecord) else commit.message.lower())
+
+class SearchWorker:
+    """
+    Runs the searches of interactive mode on one background thread, so typing never waits for a scan.
+    Only the newest requested term is searched; a running search is abandoned as soon as a newer term
+    is requested. Without the commit index, each scan remembers all its matches and how far it got, so
+    a term extending the previous one only re-checks those matches and the commits not scanned yet.
+    Results are published once num_commits matches are found and again when the search completes.
+    """
+
+    def __init__(self, repo, num_commits, regex, use_index=True):
+        self.repo = repo
+        self.num_commits = num_commits
+        self.regex = regex
+        self.use_index = use_index
+        self.all_commits = []
+        self._cond = threading.Condition()
+        self._pending = None     # Newest requested term, not yet picked up by the thread.
+        self._results = None     # (term, commits, complete, total matches) not yet taken by poll().
+        self._previous = None    # (lowercased term, matches, number of commits scanned) of the last scan.
+        self._thread = threading.Thread(target=self._loop, name="gitfind-search", daemon=True)
+        self._thread.start()
+
+    def request(self, term):
+        with self._cond:
+            self._pending = term
+            self._cond.notify()
+
+    def poll(self):
+        """Return the newest unseen (term, commits, complete, total matches), or None."""
+        with self._cond:
+            results, self._results = self._results, None
+        return results
+
+    def _publish(self, term, commits, complete, total):
+        with self._cond:
+            self._results = (term, commits, complete, total)
+
+    def _cancelled(self):
+        return self._pending is not None
+
+    def _loop(self):
+        # The index (an SQLite connection) and the commit list are owned by this thread.
+        index = open_commit_index() if self.use_index else None
+        if index is None:
+            self.all_commits = fetch_all_commits(self.repo)
+        while True:
+            with self._cond:
+                while self._pending is None:
+                    self._cond.wait()
+                term, self._pending = self._pending, None
+            try:
+                if index:
+                    found = index.search(term, self.num_commits, self.regex)
+                    self._publish(term, found, True, None)
+                else:
+                    self._scan(term)
+            except re.error:
+                pass  # Incomplete regular expression while typing; keep the previous results.
+
+    def _scan(self, term):
+        matches_commit = make_matcher(term, self.regex)
+        term_lower = term.lower()
+        previous = self._previous
+        if not self.regex and previous and term_lower.startswith(previous[0]):
+            # Narrow the previous term's matches, then continue where its scan stopped.
+            candidates, start = previous[1], previous[2]
+        else:
+            candidates, start = None, 0
+
+        matches = []
+        published = False
+        if candidates is not None:
+            for i, commit in enumerate(candidates):
+                if i % CANCEL_CHECK_INTERVAL == 0 and self._cancelled():
+                    return
+                if matches_commit(commit):
+                    matches.append(commit)
+                    if not published and len(matches) >= self.num_commits:
+                        self._publish(term, matches[:self.num_commits], False, None)
+                        published = True
+
+        all_commits = self.all_commits
+        for position in range(start, len(all_commits)):
+            if position % CANCEL_CHECK_INTERVAL == 0 and self._cancelled():
+                self._previous = (term_lower, matches, position)
+                return
+            commit = all_commits[position]
+            if matches_commit(commit):
+                matches.append(commit)
+                if not published and len(matches) >= self.num_commits:
+                    self._publish(term, matches[:self.num_commits], False, None)
+                    published = True
+        self._previous = (term_lower, matches, len(all_commits))
+        self._publish(term, matches[:self.num_commits], True, len(matches))
+
+def interactive_mode(stdscr, min_char_length, num_commits, sort_order, sort_direction, regex, use_index=True):
     logger.debug("Entering interactive mode.")
     curses.echo()
+    stdscr.timeout(POLL_INTERVAL_MS)
     search_term = ""
+    status = "Loading commits..."
     repo = get_git_repo() if GITPYTHON_AVAILABLE else None
-    all_commits = fetch_all_commits(repo)
-    filtered_commits = all_commits[:num_commits]  # initially show first 'num_commits' commits
+    git_stats = get_git_stats()
+    info_cache = CommitInfoCache()
+    worker = SearchWorker(repo, num_commits, regex, use_index)
+    worker.request("")  # Show the first 'num_commits' commits until a term is entered.
+    requested = ""
+    last_key = 0.0
+    filtered_commits = []
 
     def refresh_screen():
-        stdscr.clear()
-        print_git_stats(stdscr, min_char_length, num_commits, sort_order, sort_direction, regex)
+        stdscr.erase()  # Unlike clear(), only the changed cells are sent to the terminal.
+        print_git_stats(stdscr, min_char_length, num_commits, sort_order, sort_direction, regex, git_stats)
         stdscr.addstr(12, 0, search_term)
-        display_commits(stdscr, filtered_commits, repo)
+        max_x = stdscr.getmaxyx()[1]
+        status_x = max(len(search_term) + 2, max_x - len(status) - 1)
+        if status and status_x + len(status) < max_x:
+            stdscr.addstr(12, status_x, status)
+        display_commits(stdscr, filtered_commits, repo, info_cache)
+        stdscr.move(12, len(search_term))
         stdscr.refresh()
 
     refresh_screen()
     while True:
         char = stdscr.getch()
-        if char == curses.KEY_BACKSPACE or char == 127:
-            search_term = search_term[:-1]
-        else:
-            search_term += chr(char)
+        if char != -1:
+            if char == curses.KEY_BACKSPACE or char == 127:
+                search_term = search_term[:-1]
+            else:
+                search_term += chr(char)
+            last_key = time.monotonic()
+            refresh_screen()
 
-        if len(search_term) >= min_char_length:
-            with tqdm(total=num_commits, desc="Filtering commits") as progress_bar:
-                filtered_commits = filter_commits(all_commits, search_term, num_commits, regex, repo)
-        else:
-            filtered_commits = all_commits[:num_commits]
+        # Debounce: only search once typing pauses.
+        term = search_term if len(search_term) >= min_char_length else ""
+        if term != requested and time.monotonic() - last_key >= DEBOUNCE_INTERVAL:
+            worker.request(term)
+            requested = term
+            status = "Searching..."
+            refresh_screen()
 
-        refresh_screen()
+        results = worker.poll()
+        if results and results[0] == requested:
+            _, filtered_commits, complete, total = results
+            if not complete:
+                status = "Searching... (first matches shown)"
+            elif total is not None:
+                status = f"{total} matches"
+            else:
+                status = ""
+            refresh_screen()
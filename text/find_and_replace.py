@@ -8,6 +8,24 @@ Description: Bulk find-and-replace utility for source files.
                -b, --begins   : Only process files whose names begin with a given string
                -e, --ends     : Only process files whose names end with a given string
                -c, --contains : Only process files whose names contain a given string
+               -j, --jobs     : Number of worker processes (default: number of CPUs)
+               -m, --mapping  : Apply all old -> new pairs of a mapping file in one pass
+             Files are first searched for the target string as raw bytes (memory-mapped),
+             so files without a match are only read, never written. Changed files are
+             written to a temporary file and renamed over the original, so an interrupted
+             run never leaves a truncated file. Version control directories (.git, .hg,
+             .svn) are skipped, and so are binary files (a NUL byte in the first 8000
+             bytes). A summary of files scanned, files changed and replacements per
+             second is printed at the end.
+
+Mapping file format (-m): one 'old<TAB>new' pair per line; blank lines and lines starting
+with '#' are ignored. A line starting with 're:' is a regular expression rule
+'re:<pattern><TAB><replacement>', where the replacement may use \\1 or \\g<name>.
+All rules are compiled into one pattern and applied simultaneously, so the output of
+one rule is never matched by another. At any position the longest match of any rule,
+literal or regular expression, wins; on equal length the rule listed first wins.
+Regular expression rules that can match the empty string are rejected. Counts of
+the hits of every rule are printed at the end.
 
 Recommendations for a more comprehensive app can be found here: https://github.com/JessyJP/Replace-Text-In-Files 
 
@@ -24,21 +42,284 @@ Also, please have a look at the standard Linux file & Text Processing Tools:
 """
 
 import os
+import re
 import sys
+import mmap
+import time
+import shutil
 import argparse
+import tempfile
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+# Directories that are never searched.
+SKIP_DIRS = {".git", ".hg", ".svn"}
+# Number of files handed to a worker process at a time.
+CHUNK_SIZE = 64
+# A matching file with a NUL byte in its first BINARY_SNIFF_BYTES is treated as binary and left alone.
+BINARY_SNIFF_BYTES = 8000
+# Group references in a replacement template (\g<name>, \g<1>, \1); three octal digits and
+# other escapes are matched too, so they are skipped as a whole.
+TEMPLATE_GROUP = re.compile(rb"\\(?:g<([^>]*)>|[0-7]{3}|([1-9][0-9]?)|.)", re.DOTALL)
+
+
+def write_atomic(filepath, data):
+    """
+    Replace the contents of filepath with data through a temporary file in the same
+    directory, renamed over the original once it is completely written.
+    """
+    directory, name = os.path.split(filepath)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=directory or ".")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(data)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        shutil.copymode(filepath, tmp_path)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class LiteralReplacer:
+    """Replaces one literal string, with plain bytes operations."""
+
+    def __init__(self, old_string, new_string):
+        self.old = old_string.encode("utf-8")
+        self.new = new_string.encode("utf-8")
+        self.labels = [f"{old_string} -> {new_string}"]
+
+    def search(self, buffer):
+        return buffer.find(self.old) != -1
+
+    def replace(self, data):
+        """Return (new data, [number of replacements])."""
+        return data.replace(self.old, self.new), [data.count(self.old)]
+
+
+def literal_trie_pattern(literals):
+    """
+    Return a regular expression (bytes) matching any of the byte strings in literals,
+    built as a trie so shared prefixes are only tried once. Longer continuations are
+    tried before a literal ends, so the longest literal at a position wins.
+    """
+    trie = {}
+    for literal in literals:
+        node = trie
+        for byte in literal:
+            node = node.setdefault(byte, {})
+        node[None] = True  # A literal ends here.
+
+    def follow(node):
+        """Skip a chain of nodes with a single child and no literal end; return (its bytes, the node after it)."""
+        chain = bytearray()
+        while len(node) == 1 and None not in node:
+            (byte, node), = node.items()
+            chain.append(byte)
+        return bytes(chain), node
+
+    def edges(node):
+        """(escaped bytes, next branching or final node) for every child of node, in byte order."""
+        return [(re.escape(bytes([byte]) + chain), end)
+                for byte, child in sorted((k, v) for k, v in node.items() if k is not None)
+                for chain, end in [follow(child)]]
+
+    # Children are built before their parents with an explicit stack, as literals may be
+    # longer than the recursion limit.
+    prefix, root = follow(trie)
+    patterns = {}
+    stack = [(root, None)]
+    while stack:
+        node, node_edges = stack.pop()
+        if node_edges is None:
+            node_edges = edges(node)
+            stack.append((node, node_edges))
+            stack.extend((end, None) for _, end in node_edges)
+            continue
+        branches = [text + patterns.pop(id(end)) for text, end in node_edges]
+        if not branches:
+            pattern = b""
+        else:
+            pattern = branches[0] if len(branches) == 1 else b"(?:" + b"|".join(branches) + b")"
+            if None in node:
+                pattern = b"(?:" + pattern + b")?"
+        patterns[id(node)] = pattern
+    return re.escape(prefix) + patterns[id(root)]
+
+
+class MultiReplacer:
+    """
+    Replaces many literals and regular expression rules in one pass over the data.
+    rules is a list of (kind, old, new) with kind "literal" or "regex", as returned by load_mapping().
+    At every position the longest match of any rule wins; between matches of equal length,
+    the rule that comes first in the mapping file wins.
+    """
+
+    def __init__(self, rules):
+        self.labels = [f"{old} -> {new}" if kind == "literal" else f"re:{old} -> {new}" for kind, old, new in rules]
+        self.literals = {}  # Literal (bytes) -> (rule number, replacement).
+        self.regexes = []   # (rule number, compiled pattern, replacement template).
+        for number, (kind, old, new) in enumerate(rules):
+            if not old:
+                raise ValueError("Empty pattern in mapping")
+            if kind == "literal":
+                if old.encode("utf-8") in self.literals:
+                    raise ValueError(f"Duplicate pattern in mapping: {old}")
+                self.literals[old.encode("utf-8")] = (number, new.encode("utf-8"))
+            else:
+                if re.search(r"\\[1-9]|\(\?P=", old):
+                    raise ValueError(f"Backreferences are not supported in regex rules: {old}")
+                pattern = re.compile(old.encode("utf-8"))
+                if pattern.fullmatch(b""):
+                    raise ValueError(f"Regex rule matches the empty string: {old}")
+                for name, index in TEMPLATE_GROUP.findall(new.encode("utf-8")):
+                    group = (name or index).decode("utf-8")
+                    known = int(group) <= pattern.groups if group.isdigit() else group in pattern.groupindex
+                    if group and not known:
+                        raise ValueError(f"Replacement refers to unknown group '{group}': re:{old} -> {new}")
+                self.regexes.append((number, pattern, new.encode("utf-8")))
+
+        # The longest literal at a position (see literal_trie_pattern()).
+        self.literal_pattern = re.compile(literal_trie_pattern(self.literals)) if self.literals else None
+        # All rules together, to find the next position where any of them matches.
+        alternatives = [self.literal_pattern.pattern] if self.literals else []
+        alternatives += [b"(?:" + pattern.pattern + b")" for _, pattern, _ in self.regexes]
+        try:
+            self.pattern = re.compile(b"|".join(alternatives))
+        except re.error as e:
+            raise ValueError(f"Regex rules cannot be combined ({e}); use scoped flags like (?i:...) and distinct group names.")
+
+    def search(self, buffer):
+        return self.pattern.search(buffer) is not None
+
+    def _longest_match(self, data, start):
+        """Return (end, rule number, replacement) of the longest non-empty match at start, or None."""
+        best = None
+        if self.literal_pattern:
+            match = self.literal_pattern.match(data, start)
+            if match and match.end() > start:
+                number, replacement = self.literals[match.group()]
+                best = (match.end(), number, replacement)
+        for number, pattern, template in self.regexes:
+            # Matched on its own, so the template refers to the rule's own groups.
+            match = pattern.match(data, start)
+            if match and match.end() > start and (best is None or match.end() > best[0]
+                                                   or (match.end() == best[0] and number < best[1])):
+                best = (match.end(), number, match.expand(template))
+        return best
+
+    def replace(self, data):
+        """Return (new data, number of replacements of every rule)."""
+        hits = [0] * len(self.labels)
+        if not self.regexes:
+            # Literals only: the trie already picks the longest literal at every position.
+            def substitute(match):
+                number, replacement = self.literals[match.group()]
+                hits[number] += 1
+                return replacement
+
+            return self.pattern.sub(substitute, data), hits
+
+        parts = []
+        copied = position = 0
+        while position <= len(data):
+            found = self.pattern.search(data, position)
+            if found is None:
+                break
+            best = self._longest_match(data, found.start())
+            if best is None:  # Only empty matches here.
+                position = found.start() + 1
+                continue
+            end, number, replacement = best
+            parts += [data[copied:found.start()], replacement]
+            hits[number] += 1
+            copied = position = end
+        parts.append(data[copied:])
+        return b"".join(parts), hits
+
+
+def load_mapping(path):
+    """
+    Read a mapping file (see the module description) and return its rules as a list of
+    (kind, old, new) with kind "literal" or "regex". Raises ValueError for malformed lines.
+    """
+    rules = []
+    with open(path, encoding="utf-8") as file:
+        for line_number, line in enumerate(file, 1):
+            line = line.rstrip("\r\n")
+            if not line or line.startswith("#"):
+                continue
+            old, tab, new = line.partition("\t")
+            if not tab or not old or old == "re:":
+                raise ValueError(f"{path}:{line_number}: expected 'old<TAB>new'")
+            if old.startswith("re:"):
+                try:
+                    re.compile(old[3:])
+                except re.error as e:
+                    raise ValueError(f"{path}:{line_number}: invalid regular expression: {e}")
+                rules.append(("regex", old[3:], new))
+            else:
+                rules.append(("literal", old, new))
+    if not rules:
+        raise ValueError(f"{path}: no rules found")
+    return rules
+
+
+def replace_in_file(filepath, replacer):
+    """
+    Process a single file with a LiteralReplacer or MultiReplacer.
+    The file is searched as bytes first and only rewritten if something matches.
+    Matching binary files (a NUL byte near the start) are skipped.
+    Returns (number of replacements of every rule, number of bytes scanned);
+    the replacements are None for a skipped binary file.
+    """
+    no_hits = [0] * len(replacer.labels)
+    with open(filepath, "rb") as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return no_hits, 0
+        try:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if not replacer.search(mapped):
+                    return no_hits, size
+                data = mapped[:]
+        except (ValueError, OSError):  # Not mappable (e.g. special files); read it instead.
+            data = file.read()
+            if not replacer.search(data):
+                return no_hits, size
+
+    if b"\0" in data[:BINARY_SNIFF_BYTES]:
+        return None, size
+    new_data, hits = replacer.replace(data)
+    if new_data != data:
+        write_atomic(filepath, new_data)
+    return hits, size
 
 
 def find_and_replace_in_file(filepath, old_string, new_string):
     """
-    Process a single file, replacing old_string with new_string in each line.
+    Process a single file, replacing every occurrence of old_string with new_string.
+    Binary files are skipped.
+    Returns (number of replacements, number of bytes scanned).
     """
-    with open(filepath, 'r', encoding="utf-8") as file:
-        lines = file.readlines()
+    hits, size = replace_in_file(filepath, LiteralReplacer(old_string, new_string))
+    return hits[0] if hits else 0, size
 
-    with open(filepath, 'w', encoding="utf-8") as file:
-        for line in lines:
-            new_line = line.replace(old_string, new_string)
-            file.write(new_line)
+
+def process_file(replacer, filepath):
+    """
+    Worker entry point: replace_in_file() that reports errors instead of raising.
+    Returns (filepath, replacements of every rule or None for a binary file, bytes scanned, error message or None).
+    """
+    try:
+        hits, size = replace_in_file(filepath, replacer)
+        return filepath, hits, size, None
+    except (OSError, re.error) as e:
+        return filepath, [], 0, str(e)
 
 
 def file_matches(filename, filter_type, filter_value):
@@ -58,29 +339,110 @@ def file_matches(filename, filter_type, filter_value):
     return True
 
 
-def process_files(directory, old_string, new_string, filter_type=None, filter_value=None):
+def collect_files(directory, filter_type=None, filter_value=None):
     """
-    Loop over files in the directory and process them if they match filter.
+    Return the paths of all files below directory that match the filter.
+    Version control directories and symbolic links are skipped.
     """
-    for subdir, _, files in os.walk(directory):
+    paths = []
+    for subdir, dirs, files in os.walk(directory):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
         for file in files:
             if file_matches(file, filter_type, filter_value):
                 filepath = os.path.join(subdir, file)
-                find_and_replace_in_file(filepath, old_string, new_string)
+                if not os.path.islink(filepath):
+                    paths.append(filepath)
+    return paths
+
+
+def process_files(directory, old_string, new_string, filter_type=None, filter_value=None, jobs=None, rules=None):
+    """
+    Loop over files in the directory and process the ones that match the filter,
+    on a pool of jobs worker processes (all CPUs by default, in-process for 1).
+    With rules (see load_mapping()), all of them are applied instead of old_string -> new_string.
+    The file list is collected before any file is written, so temporary files are never picked up.
+    Returns a dict with the counts of the run.
+    """
+    start = time.perf_counter()
+    paths = collect_files(directory, filter_type, filter_value)
+    replacer = MultiReplacer(rules) if rules else LiteralReplacer(old_string, new_string)
+    stats = {"scanned": 0, "changed": 0, "replacements": 0, "bytes": 0, "errors": 0, "binary": 0,
+             "labels": replacer.labels, "hits": [0] * len(replacer.labels)}
+    worker = partial(process_file, replacer)
+    jobs = jobs or os.cpu_count() or 1
+
+    if jobs == 1 or len(paths) <= CHUNK_SIZE:
+        results = map(worker, paths)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        results = executor.map(worker, paths, chunksize=CHUNK_SIZE)
+    try:
+        for filepath, hits, size, error in results:
+            if error:
+                stats["errors"] += 1
+                print(f"Error: {filepath}: {error}", file=sys.stderr)
+                continue
+            stats["scanned"] += 1
+            stats["bytes"] += size
+            if hits is None:
+                stats["binary"] += 1
+            elif any(hits):
+                stats["changed"] += 1
+                stats["replacements"] += sum(hits)
+                stats["hits"] = [total + count for total, count in zip(stats["hits"], hits)]
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+def format_summary(stats):
+    """One line summarising the result of process_files()."""
+    seconds = max(stats["seconds"], 1e-9)
+    summary = (f"Scanned {stats['scanned']} files ({stats['bytes'] / (1024 * 1024):.1f} MB) in {stats['seconds']:.2f}s: "
+               f"{stats['changed']} files changed, {stats['replacements']} replacements "
+               f"({stats['replacements'] / seconds:.1f} replacements/s, {stats['scanned'] / seconds:.1f} files/s).")
+    if stats["binary"]:
+        summary += f" {stats['binary']} matching binary files skipped."
+    if stats["errors"]:
+        summary += f" {stats['errors']} files could not be processed."
+    return summary
+
+
+def format_hits(stats):
+    """Lines with the number of replacements of every rule, in mapping file order."""
+    width = len(str(max(stats["hits"], default=0)))
+    return [f"{count:>{width}}  {label}" for count, label in zip(stats["hits"], stats["labels"])]
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Bulk find-and-replace utility with file filtering.")
     parser.add_argument("directory", help="Target directory to process")
-    parser.add_argument("old_string", help="String to be replaced")
-    parser.add_argument("new_string", help="String to replace with")
+    parser.add_argument("old_string", nargs="?", help="String to be replaced")
+    parser.add_argument("new_string", nargs="?", help="String to replace with")
 
     group = parser.add_mutually_exclusive_group()
     group.add_argument("-b", "--begins", help="Only process files whose names begin with this string")
     group.add_argument("-e", "--ends", help="Only process files whose names end with this string")
     group.add_argument("-c", "--contains", help="Only process files whose names contain this string")
+    parser.add_argument("-m", "--mapping", help="File of old<TAB>new pairs and re: rules to apply instead of old_string/new_string")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of worker processes (default: number of CPUs)")
 
     args = parser.parse_args()
+    rules = None
+    if args.mapping:
+        if args.old_string is not None:
+            parser.error("old_string and new_string cannot be combined with --mapping")
+        try:
+            rules = load_mapping(args.mapping)
+            MultiReplacer(rules)  # Report invalid rules before any file is touched.
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    elif not args.old_string or args.new_string is None:
+        parser.error("old_string (not empty) and new_string are required without --mapping")
 
     # Determine filter type and value
     filter_type, filter_value = None, None
@@ -91,4 +453,11 @@ if __name__ == "__main__":
     elif args.contains:
         filter_type, filter_value = "contains", args.contains
 
-    process_files(args.directory, args.old_string, args.new_string, filter_type, filter_value)
+    stats = process_files(args.directory, args.old_string, args.new_string, filter_type, filter_value, args.jobs, rules)
+    print(format_summary(stats))
+    if rules:
+        print("Replacements per rule:")
+        for line in format_hits(stats):
+            print(f"  {line}")
+    if stats["errors"]:
+        sys.exit(1)